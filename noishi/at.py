@@ -1,4 +1,12 @@
-from typing import TYPE_CHECKING
+import asyncio
+import re
+from collections import deque
+from typing import TYPE_CHECKING, Iterable
+from noishi import Service
+from noishi.event.at import AtUrcReceived
+from noishi.event.serial import SerialDataReceived, SerialWriteRequest
+from noishi.exception import AtCommandError
+from noishi.framer import LineFramer
 
 if TYPE_CHECKING:
     from noishi import Context
@@ -61,11 +69,265 @@ def at_command_expect(text: str, expected: str) -> list[str]:
             result.append(line[len(expected):].lstrip())
     return result
 
-def apply(ctx: 'Context'):
+FINAL_ERROR_PREFIXES = ("ERROR", "+CME ERROR:", "+CMS ERROR:", "NO CARRIER", "BUSY", "NO ANSWER", "NO DIALTONE")
+URC_PREFIXES = (
+    "+CMTI:", "+CMT:", "+CDSI:", "+CDS:", "+CBM:", "+CLIP:", "+CRING:", "+CREG:", "+CGREG:", "+CEREG:",
+    "+CUSD:", "+CIEV:", "RING", "^", "RDY", "+CPIN:", "SMS READY", "Call Ready",
+)
+PDU_URC_PREFIXES = ("+CMT:", "+CDS:", "+CBM:")  # 后面跟一行 PDU 的 URC
+CTRL_Z = "\x1a"
+ESC = "\x1b"
+
+_RESPONSE_PREFIX = re.compile(r"AT([+^$%#&][A-Z0-9]+)", re.IGNORECASE)
+
+class _Command:
+    __slots__ = ("command", "echo", "prefix", "timeout", "lines", "future", "data", "data_echo", "prompt")
+
+    def __init__(self, command: str, timeout: float, future: asyncio.Future, data: bytes | None = None):
+        self.command = command
+        self.echo = command.strip()
+        match = _RESPONSE_PREFIX.match(self.echo)
+        self.prefix = match.group(1).upper() + ":" if match else None
+        self.timeout = timeout
+        self.lines: list[str] = []
+        self.future = future
+        # 需要在 "> " 提示符后写入的数据（如 AT+CMGS 的 PDU）
+        self.data = data
+        self.data_echo = data.decode("latin-1").strip().rstrip(CTRL_Z) if data is not None else None
+        self.prompt: asyncio.Future | None = future.get_loop().create_future() if data is not None else None
+
+class _PortState:
+    __slots__ = ("framer", "queue", "current", "wakeup", "worker", "urc_header", "resync")
+
+    def __init__(self):
+        self.framer = LineFramer()
+        self.queue: deque[_Command] = deque()
+        self.current: _Command | None = None
+        self.wakeup = asyncio.Event()
+        self.worker: asyncio.Task | None = None
+        self.urc_header: str | None = None
+        # 超时后重新对齐期间不为 None，每收到一个最终结果码置位一次
+        self.resync: asyncio.Event | None = None
+
+class AtService(Service['Context']):
+    """
+    AT 命令调度：每个端口一个按序执行的命令队列，响应按最终结果码与请求对应，
+    其余行作为 AtUrcReceived 发出。
+    命令超时后端口进入重新对齐状态，丢弃非 URC 行，直到超时命令的最终结果码到达；
+    resync_timeout 秒内没有到达时发送 ESC 与 AT 探测，收到结果码且 resync_quiet 秒内不再有结果码后才执行下一条命令，
+    避免迟到的响应被当作下一条命令的结果。
+    """
+    def __init__(
+        self, ctx: 'Context', default_port: str | None = None, resync_timeout: float = 2.0, resync_quiet: float = 0.2,
+    ):
+        super().__init__(ctx)
+        self.default_port = default_port
+        self.resync_timeout = resync_timeout
+        self.resync_quiet = resync_quiet
+        self.resyncs = 0
+        self._ports: dict[str, _PortState] = {}
+        self._running = True
+        ctx.register_event_handler(self.handle_serial_rx)
+
+    def _state(self, port: str) -> _PortState:
+        state = self._ports.get(port)
+        if state is None:
+            state = self._ports[port] = _PortState()
+        if state.worker is None and self._running:
+            state.worker = asyncio.create_task(self._run(port, state))
+        return state
+
+    def queue_depth(self, port: str) -> int:
+        "端口上排队及执行中的命令数。"
+        state = self._ports.get(port)
+        if state is None:
+            return 0
+        return len(state.queue) + (state.current is not None)
+
+    def pick_port(self, ports: Iterable[str]) -> str:
+        "选出排队命令最少的端口，相同时取靠前的。"
+        best = None
+        best_depth = -1
+        for port in ports:
+            depth = self.queue_depth(port)
+            if depth == 0:
+                return port
+            if best is None or depth < best_depth:
+                best, best_depth = port, depth
+        if best is None:
+            raise ValueError("没有可选的端口。")
+        return best
+
+    async def send(
+        self, command: str, port: str | None = None, timeout: float = 5.0, data: str | bytes | None = None,
+    ) -> list[str]:
+        """
+        发送 AT 命令并等待最终结果码，返回中间响应行（不含回显与 OK）。
+        data 不为 None 时在收到 "> " 提示符后写入 data（结尾自动补 Ctrl-Z），用于 AT+CMGS 等命令。
+        失败时抛出 AtCommandError，超时抛出 asyncio.TimeoutError。
+        响应经由 SerialDataReceived 送达，不要在串口接收的同一处理链中直接 await。
+        """
+        if not self._running:
+            raise RuntimeError("AT 服务已停止。")
+        if port is None:
+            port = self.default_port or (next(iter(self._ports)) if len(self._ports) == 1 else None)
+            if port is None:
+                raise ValueError("未指定端口，且无法确定默认端口。")
+        if not command.endswith(("\r", "\n")):
+            command += "\r"
+        if isinstance(data, str):
+            data = data.encode()
+        if data is not None and not data.endswith((b"\x1a", b"\x1b")):
+            data += b"\x1a"
+        state = self._state(port)
+        cmd = _Command(command, timeout, asyncio.get_running_loop().create_future(), data)
+        state.queue.append(cmd)
+        state.wakeup.set()
+        return await cmd.future
+
+    async def _run(self, port: str, state: _PortState):
+        while True:
+            while not state.queue:
+                state.wakeup.clear()
+                await state.wakeup.wait()
+            cmd = state.queue.popleft()
+            if cmd.future.done():
+                continue
+            state.current = cmd
+            try:
+                # 命令超时后不应再写出（例如断开期间缓冲、重连后才写出）
+                deadline = asyncio.get_running_loop().time() + cmd.timeout
+                await self.ctx.send_event(SerialWriteRequest(port, cmd.command.encode(), deadline))
+                if cmd.prompt is None:
+                    done, _ = await asyncio.wait((cmd.future,), timeout=cmd.timeout)
+                else:
+                    done = await self._send_data(port, cmd)
+                if not done:
+                    cmd.future.set_exception(asyncio.TimeoutError(f"AT 命令 {cmd.echo!r} 超时 ({cmd.timeout}s)"))
+                    await self._resync(port, state)
+            except Exception as e:
+                if not cmd.future.done():
+                    cmd.future.set_exception(e)
+            finally:
+                state.current = None
+                state.resync = None
+
+    async def _resync(self, port: str, state: _PortState):
+        "超时后重新对齐：先等超时命令的迟到结果码，仍未到达时发送 ESC 与 AT 探测。"
+        self.resyncs += 1
+        state.resync = asyncio.Event()
+        if await self._await_final(state, self.resync_timeout, None):
+            return
+        # 可能停在 "> " 输入状态，ESC 退出后再探测；迟到的结果码可能与探测的结果码先后到达，须等到安静
+        deadline = asyncio.get_running_loop().time() + self.resync_timeout
+        await self.ctx.send_event(SerialWriteRequest(port, (ESC + "AT\r").encode(), deadline))
+        await self._await_final(state, self.resync_timeout, self.resync_quiet)
+        # 仍无响应时（端口可能断开）放弃对齐，继续执行后续命令
+
+    async def _await_final(self, state: _PortState, timeout: float, quiet: float | None) -> bool:
+        "等待最终结果码；quiet 不为 None 时还要等到之后 quiet 秒内不再有结果码。返回是否收到过结果码。"
+        assert state.resync is not None
+        received = False
+        while True:
+            state.resync.clear()
+            try:
+                await asyncio.wait_for(state.resync.wait(), timeout)
+            except asyncio.TimeoutError:
+                return received
+            received = True
+            if quiet is None:
+                return True
+            timeout = quiet
+
+    async def _send_data(self, port: str, cmd: _Command) -> set:
+        "等待提示符后写入数据，在同一超时内等待结果；提示符后超时时发送 ESC 退出输入状态。"
+        assert cmd.prompt is not None and cmd.data is not None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + cmd.timeout
+        await asyncio.wait((cmd.prompt, cmd.future), timeout=cmd.timeout, return_when=asyncio.FIRST_COMPLETED)
+        if cmd.future.done():
+            return {cmd.future}
+        if not cmd.prompt.done():
+            return set()
+        await self.ctx.send_event(SerialWriteRequest(port, cmd.data, deadline))
+        done, _ = await asyncio.wait((cmd.future,), timeout=max(0.0, deadline - loop.time()))
+        if not done:
+            await self.ctx.send_event(SerialWriteRequest(port, ESC.encode()))
+        return done
+
+    async def handle_serial_rx(self, event: SerialDataReceived):
+        if not self._running:
+            return
+        state = self._state(event.port)
+        urcs = []
+        for line in state.framer.feed(event.data):
+            parsed = self._handle_line(state, line)
+            if parsed is not None:
+                urcs.append(AtUrcReceived(event.port, *parsed))
+        cmd = state.current
+        if cmd is not None and cmd.prompt is not None and not cmd.prompt.done():
+            # 提示符 "> " 后没有换行，留在分帧器的未完成行中
+            if state.framer.pending.lstrip().startswith(b">"):
+                state.framer.reset()
+                cmd.prompt.set_result(None)
+        for urc_event in urcs:
+            await self.ctx.send_event(urc_event)
+
+    def _handle_line(self, state: _PortState, line: str) -> tuple[str, str | None] | None:
+        "处理一行输入，是 URC 时返回 (行, PDU)。"
+        if state.urc_header is not None:
+            header, state.urc_header = state.urc_header, None
+            return header, line
+
+        cmd = state.current
+        own_response = cmd is not None and cmd.prefix is not None and line.startswith(cmd.prefix)
+        if not own_response:
+            if line.startswith(PDU_URC_PREFIXES):
+                state.urc_header = line
+                return None
+            if cmd is None or line.startswith(URC_PREFIXES):
+                return line, None
+
+        if cmd.future.done():
+            if state.resync is not None and (line == "OK" or line.startswith(FINAL_ERROR_PREFIXES)):
+                state.resync.set()
+            return None
+        if line == cmd.echo:
+            return None
+        if cmd.prompt is not None:
+            if line == ">" and not cmd.prompt.done():
+                cmd.prompt.set_result(None)
+                return None
+            if line.rstrip(CTRL_Z) == cmd.data_echo:
+                return None
+        if line == "OK":
+            cmd.future.set_result(cmd.lines)
+        elif line.startswith(FINAL_ERROR_PREFIXES):
+            cmd.future.set_exception(AtCommandError(cmd.command, line))
+        else:
+            cmd.lines.append(line)
+        return None
+
+    def unregister(self):
+        self._running = False
+        self.ctx.unregister_event_handler(self.handle_serial_rx)
+        for state in self._ports.values():
+            if state.worker is not None:
+                state.worker.cancel()
+            for cmd in state.queue:
+                cmd.future.cancel()
+            if state.current is not None:
+                state.current.future.cancel()
+
+def apply(ctx: 'Context', default_port: str | None = None, **options):
+    "options 见 AtService。"
     at = ctx.register("at")
     command = at.register("command")
     command.register("export",at_command_expect)
     command.register("build",at_command_build)
+    scheduler = at.register("scheduler", AtService(ctx, default_port, **options))
+    at.register("send", scheduler.send)
+    at.register("pick_port", scheduler.pick_port)
     return at
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import time
 import traceback
 import types
 import watchfiles
@@ -23,6 +25,33 @@ def get_module_info(mod: types.ModuleType) -> ModuleInfo:
         path=Path(os.path.abspath(mod_path))
     )
 
+def _hash_code(code: types.CodeType, digest) -> None:
+    # 不包含文件名、行号与位置表，只改动空白、注释或挪动代码位置时指纹不变
+    digest.update(code.co_code)
+    digest.update(code.co_exceptiontable if hasattr(code, "co_exceptiontable") else b"")
+    digest.update(repr((
+        code.co_name, code.co_flags, code.co_argcount, code.co_posonlyargcount, code.co_kwonlyargcount,
+        code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars,
+    )).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(const, digest)
+        else:
+            digest.update(repr((type(const).__name__, const)).encode())
+
+def code_fingerprint(path: Path) -> str | None:
+    "源文件编译后代码对象的指纹，无法读取或编译时返回 None。"
+    try:
+        code = compile(path.read_bytes(), str(path), "exec", dont_inherit=True)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    _hash_code(code, digest)
+    return digest.hexdigest()
+
+def _python_files(path: Path) -> list[Path]:
+    return sorted(path.rglob("*.py")) if path.is_dir() else [path]
+
 async def auto_hot_reload(
     ctx: Context, 
     module_infos: Iterable[types.ModuleType | ModuleInfo],
@@ -40,8 +69,10 @@ async def auto_hot_reload(
         print("Auto hot-reload enabled, but no valid modules to watch.")
         return
     
-    path_to_module = {mod_info["path"]: mod_info for mod_info in module_infos}
+    # 路径前缀索引：沿变更文件的父目录向上查找，复杂度 O(目录深度)
+    path_to_module = {Path(mod_info["path"]).resolve(): mod_info["name"] for mod_info in module_infos}
     watch_paths = list(path_to_module.keys())
+    fingerprints = {file: code_fingerprint(file) for path in watch_paths for file in _python_files(path)}
     
     debounce_ms = int(debounce_delay_seconds * 1000)
     print(f"Starting hot-reload watcher on {len(watch_paths)} locations...")
@@ -51,21 +82,36 @@ async def auto_hot_reload(
         debounce=debounce_ms,
         watch_filter=watchfiles.PythonFilter()
     ):
+        changed: list[str] = []
         for change_type, file_path in changes:
-            if change_type == watchfiles.Change.modified:
-                file_path = Path(file_path).resolve()
-                for watch_path in watch_paths:
-                    watch_path = Path(watch_path).resolve()
-                    if watch_path in file_path.parents or file_path == watch_path:
-                        name = path_to_module[watch_path]["name"]
-                        print(f"[watchfiles] Detected change in {name}, reloading...")
-                        try:
-                            ctx.reload_sub_module(name)
-                            print(f"模块 {name} 重载成功")
-                        except Exception as e:
-                            stack_str = ''.join(traceback.format_exception(
-                                type(e), e, e.__traceback__
-                            ))
-                            print(f"模块 {name} 重载失败:\n{stack_str}")
+            if change_type != watchfiles.Change.modified:
+                continue
+            file_path = Path(file_path).resolve()
+            for candidate in (file_path, *file_path.parents):
+                name = path_to_module.get(candidate)
+                if name is not None:
+                    fingerprint = code_fingerprint(file_path)
+                    if fingerprint is not None and fingerprint == fingerprints.get(file_path):
+                        print(f"[watchfiles] {file_path.name} 编译结果未变化，跳过重载 {name}")
                         break
-        
\ No newline at end of file
+                    fingerprints[file_path] = fingerprint
+                    if name not in changed:
+                        changed.append(name)
+                    break
+        if not changed:
+            continue
+
+        print(f"[watchfiles] Detected change in {', '.join(changed)}, reloading...")
+        start = time.perf_counter()
+        try:
+            report = ctx.reload_sub_modules(changed)
+            print(
+                f"模块 {', '.join(report.modules)} 重载成功，"
+                f"耗时 {(time.perf_counter() - start) * 1000:.1f} ms"
+                f"（导入 {report.import_seconds * 1000:.1f} ms，服务中断 {report.downtime_seconds * 1000:.1f} ms）"
+            )
+        except Exception as e:
+            stack_str = ''.join(traceback.format_exception(
+                type(e), e, e.__traceback__
+            ))
+            print(f"模块 {', '.join(changed)} 重载失败:\n{stack_str}")
@@ -1,18 +1,51 @@
 import asyncio
-from collections import defaultdict
-from typing import Callable, Type, Optional, Union, Any, TypeAlias, get_args, overload, TypeVar, Generic
+import bisect
+import contextvars
+import dataclasses
+import enum
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING, Callable, Iterable, Literal, NamedTuple, Type, Optional, Union, Any, TypeAlias, get_args, overload, TypeVar, Generic
 import inspect
 import functools
 import types
 from abc import ABC, abstractmethod
 import importlib
+import time
+import traceback
+import weakref
 from noishi.exception import SubModuleInjectError, SubModuleNoExistApplyError, SubModuleApplyArgsError
 
+if TYPE_CHECKING:
+    from typing_extensions import dataclass_transform  # typing 中的版本需要 Python 3.11
+else:
+    def dataclass_transform(**kwargs):
+        return lambda func: func
+
 T = TypeVar("T", bound='Context')
 
 # ---------------------- Event & Service ----------------------
 class Event:
-    pass
+    "事件基类。没有实例属性，子类声明 __slots__（或用 @eventclass 定义）时实例不带 __dict__。"
+    __slots__ = ()
+
+E = TypeVar("E", bound=type[Event])
+
+@overload
+def eventclass(cls: E, /) -> E: ...
+@overload
+def eventclass(*, frozen: bool = False) -> Callable[[E], E]: ...
+
+@dataclass_transform()
+def eventclass(cls: E | None = None, /, *, frozen: bool = False) -> E | Callable[[E], E]:
+    """
+    把 Event 子类定义为带 __slots__ 的 dataclass，按字段注解生成 __init__、__repr__ 与 __eq__。
+    frozen 为真时实例不可修改（并可哈希），但创建开销约为两倍；类中定义的 __str__ 保持不变。
+    """
+    def wrap(cls: E) -> E:
+        if not issubclass(cls, Event):
+            raise TypeError(f"{cls.__name__} 不是 Event 的子类。")
+        return dataclasses.dataclass(slots=True, frozen=frozen)(cls)  # type: ignore[return-value]
+    return wrap if cls is None else wrap(cls)
 
 class Service(ABC,Generic[T]):
     def __init__(self, ctx: T | 'Context'):
@@ -24,13 +57,375 @@ class Service(ABC,Generic[T]):
 
 handler_type: TypeAlias = Union[Service, Callable[..., Any], 'Context', Any]
 
+ExecutionPolicy: TypeAlias = Literal["inline", "concurrent", "fire-and-forget"]
+EXECUTION_POLICIES: tuple[ExecutionPolicy, ...] = ("inline", "concurrent", "fire-and-forget")
+
+class _Dispatch(NamedTuple):
+    "按执行策略分组的处理器。"
+    inline: tuple[Callable, ...]
+    concurrent: tuple[Callable, ...]
+    detached: tuple[Callable, ...]
+
+def _check_policy(policy: str) -> None:
+    if policy not in EXECUTION_POLICIES:
+        raise ValueError(f"未知的执行策略 '{policy}'，可选: {', '.join(EXECUTION_POLICIES)}。")
+
+class Retry(NamedTuple):
+    "重试错误策略：attempts 为总调用次数（含首次），第 n 次重试前等待 min(backoff * 2**(n-1), max_backoff) 秒，仍失败时按 isolate 处理。"
+    attempts: int = 3
+    backoff: float = 0.1
+    max_backoff: float = 5.0
+
+ErrorPolicy: TypeAlias = Union[Literal["isolate", "fail-fast"], Retry]
+
+def _check_error_policy(policy: Any) -> None:
+    if not isinstance(policy, Retry) and policy not in ("isolate", "fail-fast"):
+        raise ValueError(f"未知的错误策略 '{policy}'，可选: isolate, fail-fast 或 Retry(...)。")
+
+@eventclass
+class EventHandlerError(Event):
+    "事件处理器异常（isolate 或重试用尽时发出），attempts 为处理器的总调用次数。该事件的处理器出错时只打印，不再发出。"
+    events: tuple[Event, ...]
+    handler: Callable
+    exception: Exception
+    attempts: int = 1
+
+    def __str__(self):
+        name = getattr(self.handler, "__qualname__", repr(self.handler))
+        return f"EventHandlerError({name}, attempts={self.attempts}): {self.exception!r}"
+
+_BIND_PLAN_CACHE_SIZE = 256
+
+def _compile_bind_plan(
+    params: list[tuple[str, tuple[type, bool]]],
+    event_types: tuple[type, ...],
+) -> tuple[tuple[tuple[str, int | None], ...], ...]:
+    "为一组事件类型搜索所有参数绑定方案，结果为 (参数名, 事件下标) 序列。"
+    mappings: list[tuple[tuple[str, int | None], ...]] = []
+
+    def backtrack(i: int, current_bind: list[tuple[str, int | None]], used: set[int]):
+        if i >= len(params):
+            mappings.append(tuple(current_bind))
+            return
+        pname, (ptype, optional) = params[i]
+        candidates = [idx for idx, et in enumerate(event_types) if idx not in used and issubclass(et, ptype)]
+        for idx in candidates:
+            current_bind.append((pname, idx))
+            used.add(idx)
+            backtrack(i + 1, current_bind, used)
+            used.remove(idx)
+            current_bind.pop()
+        if optional and not candidates:
+            current_bind.append((pname, None))
+            backtrack(i + 1, current_bind, used)
+            current_bind.pop()
+
+    backtrack(0, [], set())
+    return tuple(mappings)
+
+class ReloadReport(NamedTuple):
+    "reload_sub_modules 的结果。"
+    modules: list[str]  # 重新应用的子模块，按拓扑序
+    results: dict[str, list]  # 子模块 -> add_sub_module 返回值
+    import_seconds: float  # 重新导入耗时，期间服务不中断
+    downtime_seconds: float  # 从拆除到重新应用完成的服务中断时长
+
+async def _gather_all(tasks: list[asyncio.Task]) -> None:
+    "等待全部任务结束后再抛出第一个异常，避免其余任务的结果无人获取。"
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+
+# ---------------------- Lanes ----------------------
+class Lane(enum.IntEnum):
+    "事件优先级车道，数值越小优先级越高。"
+    HIGH = 0
+    NORMAL = 1
+    BULK = 2
+
+class _Route(NamedTuple):
+    lane: Lane
+    ordered: type | None  # 有序时为配置的事件类型，其子类共用同一队列
+
+class _OrderedScope:
+    "一次有序分发的作用域，分发结束后失效。"
+    __slots__ = ("key", "active")
+
+    def __init__(self, key: type):
+        self.key = key
+        self.active = True
+
+# 当前所在的有序分发。分发中创建的任务（并发处理器、gather、wait_for 等）继承它，其中同一有序类型的
+# 嵌套发送直接分发，避免等待自己；分发结束后作用域失效，之后仍在运行的任务再发送时照常排队
+_ordered_scope: contextvars.ContextVar[_OrderedScope | None] = contextvars.ContextVar("noishi_ordered_scope", default=None)
+
+class _LaneScheduler:
+    """
+    车道调度：每条车道一个无序队列，每个有序事件类型一个队列，各由一个按需启动的工作任务消费。
+    - 无序队列按 FIFO 启动分发，分发之间并发执行；有序队列逐个执行完毕再取下一个
+    - 启动任何分发前先等待更高车道中可立即启动的排队项清空，正在执行中的高优先级分发不阻塞低车道，
+      因此高车道的处理器可以等待低车道事件而不会死锁
+    - 无序事件在本车道无排队且不被阻塞时由发送方直接分发，不经过队列
+    - 发送方等待分发完成，分发中的异常（fail-fast）原样抛给发送方
+    - 有序分发进行中，处理器（及其创建的子任务）发送同一有序类型的事件时直接分发，不会等待自己而死锁
+    """
+    def __init__(self, ctx: 'Context'):
+        self.ctx = ctx
+        self.queues: dict[Lane | type, deque[tuple[tuple[Event, ...], asyncio.Future]]] = {}
+        self.lanes: dict[Lane | type, Lane] = {}
+        self.workers: dict[Lane | type, asyncio.Task] = {}
+        self.busy: set[type] = set()  # 正在执行分发的有序队列
+        self.cond: asyncio.Condition | None = None
+
+    def _blocked(self, lane: Lane) -> bool:
+        for key, queue in self.queues.items():
+            if queue and self.lanes[key] < lane and key not in self.busy:
+                return True
+        return False
+
+    async def submit(self, route: _Route, events: tuple[Event, ...]) -> None:
+        if route.ordered is None and not self.queues.get(route.lane) and not self._blocked(route.lane):
+            # 无竞争：本车道没有排队项且不被更高车道阻塞，直接分发，省去排队、唤醒工作任务与新建任务
+            await self.ctx.send_event(*events, _direct=True)
+            return
+        if self.cond is None:
+            self.cond = asyncio.Condition()
+        key = route.ordered or route.lane
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        self.lanes[key] = route.lane
+        future = asyncio.get_running_loop().create_future()
+        queue.append((events, future))
+        worker = self.workers.get(key)
+        if worker is None or worker.done():
+            self.workers[key] = asyncio.create_task(self._work(key, queue, route.ordered is not None))
+        async with self.cond:
+            self.cond.notify_all()
+        await future
+
+    async def _work(self, key: Lane | type, queue: deque, ordered: bool):
+        cond = self.cond
+        assert cond is not None
+        lane = self.lanes[key]
+        while queue:
+            async with cond:
+                await cond.wait_for(lambda: not self._blocked(lane))
+                events, future = queue.popleft()
+                if ordered:
+                    self.busy.add(key)  # type: ignore[arg-type]
+                cond.notify_all()
+            if future.done():  # 发送方已取消
+                self.busy.discard(key)  # type: ignore[arg-type]
+                continue
+            if not ordered:
+                task = asyncio.create_task(self.ctx.send_event(*events, _direct=True))
+                task.add_done_callback(functools.partial(_transfer, future))
+                continue
+            scope = _OrderedScope(key)  # type: ignore[arg-type]
+            token = _ordered_scope.set(scope)
+            try:
+                await self.ctx.send_event(*events, _direct=True)
+                if not future.done():
+                    future.set_result(None)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                scope.active = False
+                _ordered_scope.reset(token)
+                self.busy.discard(key)  # type: ignore[arg-type]
+                async with cond:
+                    cond.notify_all()
+
+def _in_scope(key: type) -> bool:
+    scope = _ordered_scope.get()
+    return scope is not None and scope.active and scope.key is key
+
+def _transfer(future: asyncio.Future, task: asyncio.Task) -> None:
+    if future.done():
+        if not task.cancelled():
+            task.exception()  # 发送方已取消，标记异常已获取
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())  # type: ignore[arg-type]
+    else:
+        future.set_result(None)
+
+# ---------------------- Binding ----------------------
+class Binding:
+    "Context.bind 返回的句柄：缓存解析结果，上下文注册变更后在下次使用时重新解析。"
+    __slots__ = ("_ctx", "path", "_target", "_version")
+
+    def __init__(self, ctx: 'Context', path: str):
+        self._ctx = ctx
+        self.path = path
+        self._target: Any = None
+        self._version = -1
+
+    @property
+    def target(self) -> Any:
+        ctx = self._ctx
+        if self._version != ctx._version:
+            self._target = ctx.get(self.path)
+            self._version = ctx._version
+        return self._target
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.target(*args, **kwargs)
+
+    async def acall(self, *args, **kwargs) -> Any:
+        "调用目标并等待结果；目标提供 acall 时（如 shard 的远程代理）经由它调用，不阻塞事件循环。"
+        target = self.target
+        acall = getattr(target, "acall", None)
+        result = acall(*args, **kwargs) if acall is not None else target(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return await result
+        return result
+
+    def __repr__(self) -> str:
+        return f"Binding({self.path!r})"
+
+# ---------------------- Metrics ----------------------
+DEFAULT_LATENCY_BUCKETS: tuple[float, ...] = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+class HandlerStats:
+    "单个事件处理器的调用统计，histogram[i] 为耗时不超过 bounds[i] 的次数，最后一项为超出上界的次数。"
+    __slots__ = ("name", "bounds", "calls", "errors", "total_seconds", "max_seconds", "histogram")
+
+    def __init__(self, name: str, bounds: tuple[float, ...]):
+        self.name = name
+        self.bounds = bounds
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(bounds) + 1)
+
+    def observe(self, seconds: float) -> None:
+        self.calls += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.histogram[bisect.bisect_left(self.bounds, seconds)] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        labels = [f"<={b:g}" for b in self.bounds] + ["+inf"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_seconds": self.total_seconds,
+            "max_seconds": self.max_seconds,
+            "histogram": dict(zip(labels, self.histogram)),
+        }
+
+class EventMetrics(Service['Context']):
+    """
+    事件总线统计，由 Context.enable_metrics 注册为 "metrics"，注销即停止统计。
+    启用时分发缓存中的处理器被替换为计时包装，未启用时 send_event 只多一次判断。
+    处理器注销后其统计一并移除。
+    """
+    def __init__(self, ctx: 'Context', buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(ctx)
+        self.buckets = tuple(sorted(buckets))
+        self.events: dict[type, int] = {}
+        self.handlers: dict[Callable, HandlerStats] = {}
+        self.in_flight = 0
+        self._instrumented: dict[Callable, Callable] = {}
+
+    def count(self, events: tuple[Event, ...]) -> None:
+        counts = self.events
+        for event in events:
+            et = type(event)
+            counts[et] = counts.get(et, 0) + 1
+
+    def instrument(self, cb: Callable) -> Callable:
+        "返回处理器的计时包装（同一处理器复用同一包装）。"
+        timed = self._instrumented.get(cb)
+        if timed is not None:
+            return timed
+        stats = self.handlers[cb] = HandlerStats(f"{cb.__module__}.{cb.__qualname__}", self.buckets)
+        clock = time.perf_counter
+
+        async def timed(*events):
+            self.in_flight += 1
+            start = clock()
+            try:
+                await cb(*events)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                stats.observe(clock() - start)
+
+        timed.__wrapped__ = cb  # type: ignore[attr-defined]
+        self._instrumented[cb] = timed
+        return timed
+
+    def forget(self, cb: Callable) -> None:
+        self._instrumented.pop(cb, None)
+        self.handlers.pop(cb, None)
+
+    def snapshot(self) -> dict[str, Any]:
+        "当前统计的副本：事件类型与处理器以 模块.限定名 为键，同名处理器加 #序号 区分。"
+        handlers: dict[str, dict[str, Any]] = {}
+        for stats in self.handlers.values():
+            name = stats.name
+            n = 2
+            while name in handlers:
+                name = f"{stats.name}#{n}"
+                n += 1
+            handlers[name] = stats.snapshot()
+        return {
+            "events": {f"{et.__module__}.{et.__qualname__}": n for et, n in self.events.items()},
+            "handlers": handlers,
+            "in_flight": self.in_flight,
+            "detached_tasks": len(self.ctx._detached_tasks),
+        }
+
+    def reset(self) -> None:
+        "清零计数，保留已注册处理器的条目。"
+        self.events.clear()
+        for cb, stats in self.handlers.items():
+            self.handlers[cb] = HandlerStats(stats.name, self.buckets)
+        # 计时包装持有旧的统计对象，重建以使用新的
+        self._instrumented.clear()
+        self.ctx._dispatch_cache.clear()
+
+    def unregister(self) -> None:
+        if self.ctx._metrics is self:
+            self.ctx._metrics = None
+            self.ctx._dispatch_cache.clear()
+
 # ---------------------- Context ----------------------
 class Context:
-    def __init__(self):
+    def __init__(self, execution_policy: ExecutionPolicy = "concurrent", error_policy: ErrorPolicy = "isolate"):
+        _check_policy(execution_policy)
+        _check_error_policy(error_policy)
         self._handler: dict[str, handler_type] = {}
         self._event_handler: dict[Type[Event], list[Callable]] = defaultdict(list)
-        self._module_info: dict[str, dict[str,Union[types.ModuleType,list,tuple,dict]]] = {}  # module_name -> {"module": module, "names": [], "args":(), "kwargs":{}}
+        self._dispatch_cache: dict[type, _Dispatch] = {}  # 具体事件类型 -> 展开并去重后的处理器
+        self._execution_policy: ExecutionPolicy = execution_policy
+        self._event_policy: dict[type, ExecutionPolicy] = {}
+        self._handler_policy: dict[Callable, ExecutionPolicy] = {}
+        self._error_policy: ErrorPolicy = error_policy
+        self._event_error_policy: dict[type, ErrorPolicy] = {}
+        self._handler_error_policy: dict[Callable, ErrorPolicy] = {}
+        self._detached_tasks: set[asyncio.Task] = set()
+        self._module_info: dict[str, dict[str,Union[types.ModuleType,list,tuple,dict]]] = {}  # module_name -> {"module": module, "names": [], "handlers": [], "args":(), "kwargs":{}}
         self._tracking_module: Optional[str] = None
+        self._path_cache: dict[str, handler_type] = {}  # 点分路径 -> 对象
+        self._version = 0  # 本上下文及子上下文的注册变更计数，供 Binding 判断是否需要重新解析
+        self._parent: Optional[weakref.ReferenceType['Context']] = None
+        self._name_in_parent: Optional[str] = None
+        self._metrics: Optional[EventMetrics] = None
+        self._event_lane: dict[type, _Route] = {}
+        self._route_cache: dict[type, _Route | None] = {}
+        self._lanes = _LaneScheduler(self)
 
     @overload
     def register(self, name: str) -> 'Context': 
@@ -58,6 +453,10 @@ class Context:
         
         result = handler if handler is not None else Context()
         self._handler[name] = result
+        if isinstance(result, Context):
+            result._parent = weakref.ref(self)
+            result._name_in_parent = name
+        self._invalidate_path(name)
 
         if self._tracking_module:
             self._module_info[self._tracking_module]["names"].append(name)
@@ -66,6 +465,11 @@ class Context:
 
     def get(self, path: str) -> handler_type:
         "通过路径获取对象。"
+        try:
+            return self._path_cache[path]
+        except KeyError:
+            pass
+
         parts = path.split('.', 1)
         key = parts[0]
         if key not in self._handler:
@@ -73,12 +477,26 @@ class Context:
         
         handler = self._handler[key]
 
-        if len(parts) == 1:
-            return handler
-        else:
+        if len(parts) > 1:
             if not isinstance(handler, Context):
                 raise ValueError(f"'{key}' 不是子上下文，无法访问 '{parts[1]}'")
-            return handler.get(parts[1])
+            handler = handler.get(parts[1])
+        self._path_cache[path] = handler
+        return handler
+
+    def bind(self, path: str) -> 'Binding':
+        "绑定路径，返回可在热路径中长期持有的句柄，路径上的对象重载后自动重新解析。"
+        return Binding(self, path)
+
+    def _invalidate_path(self, name: str) -> None:
+        "清除经过 name 的路径缓存，并向上通知父上下文。"
+        prefix = name + '.'
+        for cached in [p for p in self._path_cache if p == name or p.startswith(prefix)]:
+            del self._path_cache[cached]
+        self._version += 1
+        parent = self._parent() if self._parent is not None else None
+        if parent is not None:
+            parent._invalidate_path(f"{self._name_in_parent}.{name}")
 
     def __getattr__(self, name: str) -> handler_type:
         if name in self._handler:
@@ -104,6 +522,9 @@ class Context:
             handler.unregister()
 
         del self._handler[name]
+        self._invalidate_path(name)
+        if isinstance(handler, Context) and handler._name_in_parent == name:
+            handler._parent = None
 
     def reload(self, name: str, handler: handler_type) -> 'Context':
         "重载对象。"
@@ -111,8 +532,76 @@ class Context:
             self.unregister(name)
         return self.register(name, handler)
 
-    def register_event_handler(self, func: Callable) -> Callable:
-        "注册事件处理器"
+    def enable_metrics(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS) -> EventMetrics:
+        "启用事件总线统计并注册为 \"metrics\"，已启用时返回现有实例；用 ctx.get(\"metrics\").snapshot() 读取。"
+        if self._metrics is not None:
+            return self._metrics
+        metrics = EventMetrics(self, buckets)
+        self.register("metrics", metrics)
+        self._metrics = metrics
+        self._dispatch_cache.clear()
+        return metrics
+
+    def disable_metrics(self) -> None:
+        if self._metrics is not None:
+            self.unregister("metrics")
+
+    def set_event_policy(self, event_type: Type[Event], policy: ExecutionPolicy | None) -> None:
+        "设置事件类型（含子类）的执行策略，None 表示恢复默认。"
+        if policy is None:
+            self._event_policy.pop(event_type, None)
+        else:
+            _check_policy(policy)
+            self._event_policy[event_type] = policy
+        self._invalidate_dispatch((event_type,))
+
+    def set_event_lane(self, event_type: Type[Event], lane: Lane | None, ordered: bool = False) -> None:
+        """
+        把事件类型（含子类）分配到优先级车道，None 表示恢复默认（不经过车道直接分发）。
+        ordered 为真时该类型的事件由专门的工作任务逐个分发，前一个的全部处理器结束后才开始下一个。
+        多个事件一起发送时按第一个事件的类型选择车道。
+        """
+        if lane is None:
+            self._event_lane.pop(event_type, None)
+        else:
+            self._event_lane[event_type] = _Route(Lane(lane), event_type if ordered else None)
+        self._route_cache.clear()
+
+    def _resolve_route(self, event_type: type) -> _Route | None:
+        route = None
+        for et in event_type.__mro__:
+            route = self._event_lane.get(et)
+            if route is not None:
+                break
+        self._route_cache[event_type] = route
+        return route
+
+    def set_event_error_policy(self, event_type: Type[Event], policy: ErrorPolicy | None) -> None:
+        "设置事件类型（含子类）处理器出错时的策略，None 表示恢复默认。"
+        if policy is None:
+            self._event_error_policy.pop(event_type, None)
+        else:
+            _check_error_policy(policy)
+            self._event_error_policy[event_type] = policy
+
+    @overload
+    def register_event_handler(self, func: Callable, *, policy: ExecutionPolicy | None = None, error_policy: ErrorPolicy | None = None) -> Callable: ...
+
+    @overload
+    def register_event_handler(self, func: None = None, *, policy: ExecutionPolicy | None = None, error_policy: ErrorPolicy | None = None) -> Callable[[Callable], Callable]: ...
+
+    def register_event_handler(self, func: Callable | None = None, *, policy: ExecutionPolicy | None = None, error_policy: ErrorPolicy | None = None) -> Callable:
+        """
+        注册事件处理器
+        - policy: 执行策略，默认取事件类型或上下文的设置
+        - error_policy: 出错时的策略，isolate 发出 EventHandlerError 后继续，fail-fast 由 send_event 抛出，Retry(...) 退避重试
+        """
+        if func is None:
+            return functools.partial(self.register_event_handler, policy=policy, error_policy=error_policy)
+        if policy is not None:
+            _check_policy(policy)
+        if error_policy is not None:
+            _check_error_policy(error_policy)
         if not asyncio.iscoroutinefunction(func):
             raise TypeError("事件处理器必须是异步函数。")
 
@@ -134,41 +623,56 @@ class Context:
             if isinstance(real_type, type) and issubclass(real_type, Event):
                 param_events[pname] = (real_type, is_optional)
 
-        async def wrapper(*events, **kwargs):
-            def type_depth(t: type) -> int:
-                return len(inspect.getmro(t))
-
-            params = sorted(param_events.items(), key=lambda item: type_depth(item[1][0]), reverse=True)
-            mappings = []
-
-            def backtrack(i: int, current_bind: dict[str, Event | None], used: set[int]):
-                if i >= len(params):
-                    mappings.append(current_bind.copy())
+        # 绑定计划在注册时编译：参数按 MRO 深度排序一次，组合搜索结果按事件类型元组缓存。
+        params = sorted(param_events.items(), key=lambda item: len(item[1][0].__mro__), reverse=True)
+        plans: dict[tuple[type, ...], tuple[tuple[tuple[str, int | None], ...], ...]] = {}
+
+        if len(params) == 1 and not params[0][1][1]:
+            pname, (ptype, _) = params[0]
+            first = next(iter(sig.parameters.values()))
+            positional = first.name == pname and first.kind in (
+                inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+
+            async def wrapper(*events, **kwargs):
+                if len(events) == 1:
+                    event = events[0]
+                    if isinstance(event, ptype):
+                        await (func(event) if positional else func(**{pname: event}))
+                    return
+                tasks = [asyncio.create_task(func(e) if positional else func(**{pname: e}))
+                         for e in events if isinstance(e, ptype)]
+                if tasks:
+                    await _gather_all(tasks)
+        else:
+            async def wrapper(*events, **kwargs):
+                key = tuple(type(e) for e in events)
+                plan = plans.get(key)
+                if plan is None:
+                    if len(plans) >= _BIND_PLAN_CACHE_SIZE:
+                        plans.clear()
+                    plan = plans[key] = _compile_bind_plan(params, key)
+                if len(plan) == 1:
+                    await func(**{pname: None if idx is None else events[idx] for pname, idx in plan[0]})
                     return
-                pname, (ptype, optional) = params[i]
-                candidates = [idx for idx, e in enumerate(events) if idx not in used and isinstance(e, ptype)]
-                for idx in candidates:
-                    current_bind[pname] = events[idx]
-                    used.add(idx)
-                    backtrack(i + 1, current_bind, used)
-                    used.remove(idx)
-                    del current_bind[pname]
-                if optional and not candidates:
-                    current_bind[pname] = None
-                    backtrack(i + 1, current_bind, used)
-                    del current_bind[pname]
-
-            backtrack(0, {}, set())
-            tasks = [asyncio.create_task(func(**bind)) for bind in mappings] if mappings else []
-            if tasks:
-                await asyncio.gather(*tasks)
+                tasks = [asyncio.create_task(func(**{pname: None if idx is None else events[idx] for pname, idx in bind}))
+                         for bind in plan]
+                if tasks:
+                    await _gather_all(tasks)
 
         wrapper = functools.wraps(func)(wrapper)
 
-        for et in {ptype for ptype, _ in param_events.values()}:
+        event_types = {ptype for ptype, _ in param_events.values()}
+        for et in event_types:
             if et not in self._event_handler:
                 self._event_handler[et] = []
             self._event_handler[et].append(wrapper)
+        if policy is not None:
+            self._handler_policy[wrapper] = policy
+        if error_policy is not None:
+            self._handler_error_policy[wrapper] = error_policy
+        if self._tracking_module:
+            self._module_info[self._tracking_module]["handlers"].append(func)
+        self._invalidate_dispatch(event_types)
 
         return func
 
@@ -180,22 +684,158 @@ class Context:
             raise ValueError(f"事件处理器 {func.__name__} 没有注册。")
         for et, cb in found:
             self._event_handler[et].remove(cb)
+            self._handler_policy.pop(cb, None)
+            self._handler_error_policy.pop(cb, None)
+            if self._metrics is not None:
+                self._metrics.forget(cb)
         self._event_handler = {k: v for k, v in self._event_handler.items() if v}
-
-    async def send_event(self, *events: Event) -> None:
-        "发送事件。"
-        seen = set()
-        tasks = []
-        for event in events:
-            for et in inspect.getmro(type(event)):
-                if et is object:
+        self._invalidate_dispatch(et for et, _ in found)
+
+    def _invalidate_dispatch(self, event_types: Iterable[type]) -> None:
+        "使受影响的分发缓存失效（仅清除这些事件类型的子类）。"
+        event_types = tuple(event_types)
+        if not event_types:
+            return
+        for cached in [t for t in self._dispatch_cache if issubclass(t, event_types)]:
+            del self._dispatch_cache[cached]
+
+    def _resolve_handlers(self, event_type: type) -> _Dispatch:
+        "沿 MRO 展开事件类型的处理器并去重，按执行策略分组后写入分发缓存。"
+        handlers: dict[Callable, None] = {}
+        event_policy = None
+        for et in event_type.__mro__:
+            if et is object:
+                break
+            if event_policy is None:
+                event_policy = self._event_policy.get(et)
+            for cb in self._event_handler.get(et, ()):
+                handlers[cb] = None
+        default = event_policy or self._execution_policy
+        groups: dict[str, list[Callable]] = {p: [] for p in EXECUTION_POLICIES}
+        metrics = self._metrics
+        for cb in handlers:
+            groups[self._handler_policy.get(cb, default)].append(cb if metrics is None else metrics.instrument(cb))
+        result = _Dispatch(tuple(groups["inline"]), tuple(groups["concurrent"]), tuple(groups["fire-and-forget"]))
+        self._dispatch_cache[event_type] = result
+        return result
+
+    async def send_event(self, *events: Event, _direct: bool = False) -> None:
+        "发送事件。_direct 供车道调度内部使用，跳过车道直接分发。"
+        if events and self._event_lane and not _direct:
+            et = type(events[0])
+            route = self._route_cache[et] if et in self._route_cache else self._resolve_route(et)
+            if route is not None and (route.ordered is None or not _in_scope(route.ordered)):
+                return await self._lanes.submit(route, events)
+        cache = self._dispatch_cache
+        if len(events) == 1:
+            et = type(events[0])
+            dispatch = cache.get(et)
+            if dispatch is None:
+                dispatch = self._resolve_handlers(et)
+        else:
+            seen: set[Callable] = set()
+            merged: tuple[list[Callable], list[Callable], list[Callable]] = ([], [], [])
+            for event in events:
+                et = type(event)
+                resolved = cache.get(et)
+                if resolved is None:
+                    resolved = self._resolve_handlers(et)
+                for group, target in zip(resolved, merged):
+                    for cb in group:
+                        if cb not in seen:
+                            seen.add(cb)
+                            target.append(cb)
+            dispatch = _Dispatch(*map(tuple, merged))
+        if self._metrics is not None:
+            self._metrics.count(events)
+        inline, concurrent, detached = dispatch
+
+        for cb in detached:
+            task = asyncio.create_task(cb(*events))
+            self._detached_tasks.add(task)
+            task.add_done_callback(functools.partial(self._detached_done, cb, events))
+        tasks = [asyncio.create_task(cb(*events)) for cb in concurrent]
+        failure: BaseException | None = None
+        for cb in inline:
+            try:
+                await cb(*events)
+            except Exception as e:
+                failure = await self._handle_error(cb, events, e)
+                if failure is not None:
                     break
-                for cb in self._event_handler.get(et, []):
-                    if cb not in seen:
-                        seen.add(cb)
-                        tasks.append(asyncio.create_task(cb(*events)))
         if tasks:
-            await asyncio.gather(*tasks)
+            # 不论 inline 处理器是否失败，都等待全部并发处理器结束并处理它们的异常
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            if any(results):  # 处理器正常结束时返回 None
+                failure = await self._handle_task_errors(concurrent, results, events) or failure
+        if failure is not None:
+            raise failure
+
+    async def _handle_task_errors(self, handlers: tuple[Callable, ...], results: list, events: tuple[Event, ...]) -> Exception | None:
+        for r in results:
+            if isinstance(r, BaseException) and not isinstance(r, Exception):
+                raise r
+        errors = [(cb, r) for cb, r in zip(handlers, results) if isinstance(r, Exception)]
+        raised = await asyncio.gather(*(self._handle_error(cb, events, e) for cb, e in errors))
+        return next((e for e in raised if e is not None), None)
+
+    def _detached_done(self, cb: Callable, events: tuple[Event, ...], task: asyncio.Task) -> None:
+        self._detached_tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        # 没有调用方可以接收异常，fail-fast 也按 isolate 处理
+        handling = asyncio.ensure_future(self._handle_error(cb, events, task.exception(), raise_allowed=False))  # type: ignore[arg-type]
+        self._detached_tasks.add(handling)
+        handling.add_done_callback(self._detached_tasks.discard)
+
+    def _resolve_error_policy(self, cb: Callable, events: tuple[Event, ...]) -> ErrorPolicy:
+        policy = self._handler_error_policy.get(cb)
+        if policy is not None:
+            return policy
+        for event in events:
+            for et in type(event).__mro__:
+                policy = self._event_error_policy.get(et)
+                if policy is not None:
+                    return policy
+        return self._error_policy
+
+    async def _handle_error(
+        self, cb: Callable, events: tuple[Event, ...], exc: Exception, raise_allowed: bool = True,
+    ) -> Exception | None:
+        "按错误策略处理处理器异常，返回需要由 send_event 抛出的异常。只在出错时执行。"
+        metrics = self._metrics
+        if metrics is not None and metrics._instrumented.get(getattr(cb, "__wrapped__", None)) is cb:
+            cb = cb.__wrapped__  # 去掉统计的计时包装，得到注册时的包装
+        policy = self._resolve_error_policy(cb, events)
+        if policy == "fail-fast" and raise_allowed:
+            return exc
+
+        attempts = 1
+        if isinstance(policy, Retry):
+            call = self._instrumented(cb)
+            for retry in range(1, policy.attempts):
+                await asyncio.sleep(min(policy.backoff * 2 ** (retry - 1), policy.max_backoff))
+                attempts += 1
+                try:
+                    await call(*events)
+                    return None
+                except Exception as e:
+                    exc = e
+
+        handler = getattr(cb, "__wrapped__", cb)
+        if any(isinstance(event, EventHandlerError) for event in events) or not self._has_error_listener():
+            # 错误事件的处理器出错、或没有处理器订阅错误事件时只打印，避免递归
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+            return None
+        await self.send_event(EventHandlerError(events, handler, exc, attempts))
+        return None
+
+    def _instrumented(self, cb: Callable) -> Callable:
+        return cb if self._metrics is None else self._metrics.instrument(cb)
+
+    def _has_error_listener(self) -> bool:
+        dispatch = self._dispatch_cache.get(EventHandlerError) or self._resolve_handlers(EventHandlerError)
+        return any(dispatch)
 
     def add_sub_module(self, module: types.ModuleType, *args, **kwargs):
         "添加子模块。"
@@ -206,7 +846,7 @@ class Context:
             raise SubModuleInjectError(f"模块 {module.__name__} inject 未满足。")
 
         self._tracking_module = module.__name__
-        self._module_info[module.__name__] = {"module": module, "names": [], "args": args, "kwargs": kwargs}
+        self._module_info[module.__name__] = {"module": module, "names": [], "handlers": [], "args": args, "kwargs": kwargs}
 
         try:
             func(self, *args, **kwargs)
@@ -224,21 +864,77 @@ class Context:
             return all(k in self._handler for k in inject)
         return True
 
-    def reload_sub_module(self, module_name: str, *args, **kwargs) -> Any:
-        "重载子模块。"
-        if module_name not in self._module_info:
-            raise ValueError(f"模块 {module_name} 未注册，无法重载。")
-        
+    def _has_event_handler(self, func: Callable) -> bool:
+        return any(getattr(cb, '__wrapped__', None) == func
+                   for listeners in self._event_handler.values() for cb in listeners)
+
+    def module_dependencies(self, module_name: str) -> set[str]:
+        "子模块直接依赖的子模块：其 inject 中的名称由哪些子模块注册。"
+        inject = getattr(self._module_info[module_name]["module"], "inject", None)
+        if not isinstance(inject, list):
+            return set()
+        owners = {name: owner for owner, info in self._module_info.items() for name in info["names"]}
+        return {owners[name] for name in inject if name in owners and owners[name] != module_name}
+
+    def module_dependents(self, module_names: Iterable[str]) -> list[str]:
+        "给定子模块及其全部（传递）依赖者，按添加顺序（即拓扑序）排列。"
+        affected = set(module_names)
+        for name in affected:
+            if name not in self._module_info:
+                raise ValueError(f"模块 {name} 未注册，无法重载。")
+        # _module_info 按添加顺序排列，依赖总是先于依赖者添加，一次正向扫描即可求出闭包
+        for name in self._module_info:
+            if name not in affected and self.module_dependencies(name) & affected:
+                affected.add(name)
+        return [name for name in self._module_info if name in affected]
+
+    def _teardown_sub_module(self, module_name: str) -> None:
         info = self._module_info[module_name]
-
         for name in info["names"]:
             if name in self._handler:
                 self.unregister(name)
+        for func in info["handlers"]:
+            if self._has_event_handler(func):
+                self.unregister_event_handler(func)
+
+    def reload_sub_modules(self, module_names: Iterable[str], overrides: Optional[dict[str, tuple[tuple, dict]]] = None) -> ReloadReport:
+        """
+        重载子模块并重新应用其依赖者。
+        先重新导入变更的模块（失败时不影响正在运行的服务），再按逆拓扑序拆除受影响的子图、按拓扑序重新应用，
+        不受影响的子模块保持原样。overrides 可为指定模块提供新的 apply 参数 (args, kwargs)。
+        """
+        changed = list(dict.fromkeys(module_names))
+        order = self.module_dependents(changed)
+        overrides = overrides or {}
+
+        start = time.perf_counter()
+        reloaded = {name: importlib.reload(self._module_info[name]["module"]) for name in changed}
+        imported = time.perf_counter()
+
+        for name in reversed(order):
+            self._teardown_sub_module(name)
+        self._dispatch_cache = {t: h for t, h in self._dispatch_cache.items() if t.__module__ not in reloaded}
+
+        results: dict[str, list] = {}
+        errors: list[Exception] = []
+        for name in order:
+            info = self._module_info[name]
+            module = reloaded.get(name, info["module"])
+            args, kwargs = overrides.get(name, (info["args"], info["kwargs"]))
+            try:
+                results[name] = self.add_sub_module(module, *args, **kwargs)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return ReloadReport(order, results, imported - start, time.perf_counter() - imported)
 
-        reloaded_module = importlib.reload(info["module"])
-        self._module_info[module_name]["module"] = reloaded_module
-        
+    def reload_sub_module(self, module_name: str, *args, **kwargs) -> Any:
+        "重载子模块，依赖它的子模块会一并重新应用。"
+        if module_name not in self._module_info:
+            raise ValueError(f"模块 {module_name} 未注册，无法重载。")
+
+        info = self._module_info[module_name]
         use_args = args if args else info["args"]
         use_kwargs = kwargs if kwargs else info["kwargs"]
-
-        return self.add_sub_module(reloaded_module, *use_args, **use_kwargs)
\ No newline at end of file
+        return self.reload_sub_modules([module_name], {module_name: (use_args, use_kwargs)}).results[module_name]
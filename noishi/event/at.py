@@ -0,0 +1,13 @@
+from noishi import Event, eventclass
+
+@eventclass
+class AtUrcReceived(Event):
+    "非请求结果码。+CMT 等两行 URC 的第二行（PDU）放在 payload 中。"
+    port: str
+    line: str
+    payload: str | None = None
+
+    def __str__(self):
+        if self.payload is None:
+            return f"URC({self.port}): {self.line}"
+        return f"URC({self.port}): {self.line} | {self.payload}"
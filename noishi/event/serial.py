@@ -1,25 +1,43 @@
-from noishi import Event
+from noishi import Event, eventclass
 
+@eventclass
 class SerialDataReceived(Event):
-    def __init__(self, port: str, data: bytes):
-        self.port = port
-        self.data = data
+    port: str
+    data: bytes
 
     def __str__(self):
         return f"RX({self.port}): {self.data!r}"
 
+@eventclass
 class SerialWriteRequest(Event):
-    def __init__(self, port: str, data: bytes):
-        self.port = port
-        self.data = data
+    "deadline 为事件循环时间（loop.time()），串口断开期间缓冲的写入到重连时已过期则丢弃。"
+    port: str
+    data: bytes
+    deadline: float | None = None
 
     def __str__(self):
         return f"TX-REQ({self.port}): {self.data!r}"
 
+@eventclass
 class SerialDataSent(Event):
-    def __init__(self, port: str, data: bytes):
-        self.port = port
-        self.data = data
+    port: str
+    data: bytes
 
     def __str__(self):
-        return f"TX({self.port}): {self.data!r}"
\ No newline at end of file
+        return f"TX({self.port}): {self.data!r}"
+
+@eventclass
+class SerialConnected(Event):
+    port: str
+    reconnects: int = 0
+
+    def __str__(self):
+        return f"CONNECTED({self.port}), reconnects={self.reconnects}"
+
+@eventclass
+class SerialDisconnected(Event):
+    port: str
+    reason: str
+
+    def __str__(self):
+        return f"DISCONNECTED({self.port}): {self.reason}"
\ No newline at end of file
@@ -11,4 +11,14 @@ class SubModuleNoExistApplyError(SubModuleError):
     pass
 
 class SubModuleApplyArgsError(SubModuleError): 
-    pass
\ No newline at end of file
+    pass
+
+class AtCommandError(Exception):
+    def __init__(self, command: str, result: str):
+        super().__init__(f"AT 命令 {command.strip()!r} 执行失败: {result}")
+        self.command = command
+        self.result = result
+
+    def __reduce__(self):
+        # 默认按 args（格式化后的消息）重建，与 __init__ 的参数不符，跨进程传递时无法反序列化
+        return type(self), (self.command, self.result)
@@ -0,0 +1,198 @@
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import shutil
+import struct
+import time
+from pathlib import Path
+from typing import Any, Iterator, Literal
+from noishi import Context, Service
+from noishi.event.serial import SerialDataReceived, SerialDataSent
+from noishi.event.sms import SmsReceived
+from noishi.logger import LogEvent
+
+FileLogFormat = Literal["ndjson", "binary"]
+
+# 二进制记录: 头部 <记录长度(不含头部) u32><时间戳 f64><类型 u8>，随后为记录体
+# 串口事件的记录体为 <端口名长度 u8><端口名><原始数据>，其他事件为 UTF-8 JSON
+_HEADER = struct.Struct("<IdB")
+_KINDS = ("LogEvent", "SerialDataReceived", "SerialDataSent", "SmsReceived")
+_KIND_CODES = {name: code for code, name in enumerate(_KINDS)}
+_SERIAL_KINDS = {"SerialDataReceived", "SerialDataSent"}
+
+def _event_fields(event: Any) -> dict[str, Any]:
+    if isinstance(event, LogEvent):
+        return {"level": str(event.level), "message": event.message}
+    if isinstance(event, SmsReceived):
+        return {"sca_number": event.sca_number, "sender": event.sender, "text": event.text, "text_type": event.text_type}
+    raise TypeError(f"不支持的事件类型 {type(event).__name__}")
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+def encode_ndjson(kind: str, ts: float, event: Any) -> bytes:
+    if kind in _SERIAL_KINDS:
+        # 串口记录量最大，直接拼接，只对端口名做 JSON 转义
+        return f'{{"ts":{ts!r},"type":"{kind}","port":{_dumps(event.port)},"data":"{event.data.hex()}"}}\n'.encode()
+    return _dumps({"ts": ts, "type": kind, **_event_fields(event)}).encode() + b"\n"
+
+def encode_binary(kind: str, ts: float, event: Any) -> bytes:
+    if kind in _SERIAL_KINDS:
+        port = event.port.encode()
+        body = bytes((len(port),)) + port + event.data
+    else:
+        body = _dumps(_event_fields(event)).encode()
+    return _HEADER.pack(len(body), ts, _KIND_CODES[kind]) + body
+
+def _open_segment(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+def read_records(path: str | Path, format: FileLogFormat | None = None) -> Iterator[dict[str, Any]]:
+    """
+    读取日志段（支持 .gz），产出与 NDJSON 相同结构的字典，串口数据的 data 为 bytes。
+    format 为 None 时按文件名判断：含 .bin 为二进制，否则为 NDJSON。
+    """
+    path = Path(path)
+    if format is None:
+        format = "binary" if ".bin" in path.suffixes else "ndjson"
+    with _open_segment(path) as f:
+        if format == "ndjson":
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("type") in _SERIAL_KINDS:
+                    record["data"] = bytes.fromhex(record["data"])
+                yield record
+            return
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, ts, code = _HEADER.unpack(header)
+            body = f.read(length)
+            if len(body) < length:
+                return  # 写入中断留下的残缺记录
+            kind = _KINDS[code]
+            if kind in _SERIAL_KINDS:
+                port_len = body[0]
+                yield {"ts": ts, "type": kind, "port": body[1:1 + port_len].decode(), "data": body[1 + port_len:]}
+            else:
+                yield {"ts": ts, "type": kind, **json.loads(body)}
+
+def _compress(path: Path) -> None:
+    with open(path, "rb") as src, gzip.open(path.with_name(path.name + ".gz"), "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    path.unlink()
+
+class FileLogService(Service[Context]):
+    """
+    追加写日志文件，记录 LogEvent、串口收发与收到的短信。
+    - 每条记录只编码一次并写入用户态缓冲区，按 flush_interval 或缓冲区写满时落盘
+    - 超过 max_bytes 或到达 rotate_interval 时切换文件段，旧段重命名为 <名称>.<时间><后缀>
+    - compress 为真时旧段在线程池中压缩为 .gz，每段只额外读写一次
+    """
+    def __init__(
+        self,
+        ctx: Context,
+        path: str | Path = "logs/noishi.ndjson",
+        format: FileLogFormat = "ndjson",
+        max_bytes: int = 64 * 1024 * 1024,
+        rotate_interval: float | None = 24 * 3600,
+        compress: bool = False,
+        buffer_size: int = 256 * 1024,
+        flush_interval: float = 1.0,
+    ):
+        super().__init__(ctx)
+        if format not in ("ndjson", "binary"):
+            raise ValueError(f"未知的日志格式 '{format}'，可选: ndjson, binary。")
+        self.path = Path(path)
+        self.format = format
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.bytes_written = 0
+        self.rotations = 0
+        self._encode = encode_ndjson if format == "ndjson" else encode_binary
+        self._running = True
+        self._background: set[asyncio.Future] = set()
+        self._open()
+
+        for handler in (self.handle_log, self.handle_rx, self.handle_tx, self.handle_sms):
+            ctx.register_event_handler(handler, policy="inline")
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab", buffering=self.buffer_size)
+        self._size = self._file.tell()
+        self._rotate_at = time.monotonic() + self.rotate_interval if self.rotate_interval else None
+
+    def rotate(self) -> Path | None:
+        "切换到新的文件段，返回旧段路径；当前段为空时不切换。"
+        if self._size == 0:
+            if self._rotate_at is not None:
+                self._rotate_at = time.monotonic() + self.rotate_interval  # type: ignore[operator]
+            return None
+        self._file.close()
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        n = 1
+        while rotated.exists() or rotated.with_name(rotated.name + ".gz").exists():
+            rotated = self.path.with_name(f"{self.path.stem}.{stamp}-{n}{self.path.suffix}")
+            n += 1
+        os.replace(self.path, rotated)
+        self.rotations += 1
+        self._open()
+        if self.compress:
+            future = asyncio.get_running_loop().run_in_executor(None, _compress, rotated)
+            self._background.add(future)
+            future.add_done_callback(self._background.discard)
+        return rotated
+
+    def write(self, kind: str, event: Any):
+        if not self._running:
+            return
+        record = self._encode(kind, time.time(), event)
+        if self._size + len(record) > self.max_bytes or (
+            self._rotate_at is not None and time.monotonic() >= self._rotate_at
+        ):
+            self.rotate()
+        self._file.write(record)
+        self._size += len(record)
+        self.records += 1
+        self.bytes_written += len(record)
+
+    async def handle_log(self, event: LogEvent):
+        self.write("LogEvent", event)
+
+    async def handle_rx(self, event: SerialDataReceived):
+        self.write("SerialDataReceived", event)
+
+    async def handle_tx(self, event: SerialDataSent):
+        self.write("SerialDataSent", event)
+
+    async def handle_sms(self, event: SmsReceived):
+        self.write("SmsReceived", event)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._file.flush()
+
+    def flush(self):
+        self._file.flush()
+
+    def unregister(self):
+        self._running = False
+        for handler in (self.handle_log, self.handle_rx, self.handle_tx, self.handle_sms):
+            self.ctx.unregister_event_handler(handler)
+        self._flusher.cancel()
+        self._file.close()
+
+def apply(ctx: Context, path: str | Path = "logs/noishi.ndjson", **options):
+    ctx.register("filelog", FileLogService(ctx, path, **options))
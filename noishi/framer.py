@@ -0,0 +1,57 @@
+class LineFramer:
+    """
+    增量行分帧器：按字节缓冲串口数据，只解码完整的行。
+
+    - 每个字节只扫描一次，已消费的数据在每次 `feed` 结束时统一移除，总开销 O(n)
+    - 只解码完整行，数据块截断多字节 UTF-8 字符时不会出错
+    - 超过 `max_line_length` 字节的行被丢弃并计入 `dropped`，未结束的行超长时丢弃到下一个换行符为止
+    """
+    def __init__(self, max_line_length: int = 64 * 1024, encoding: str = "utf-8", errors: str = "replace"):
+        self.max_line_length = max_line_length
+        self.encoding = encoding
+        self.errors = errors
+        self.dropped = 0
+        self._buffer = bytearray()
+        self._scan = 0
+        self._discarding = False
+
+    @property
+    def pending(self) -> bytes:
+        "尚未以换行结束的数据。"
+        return bytes(self._buffer)
+
+    def reset(self) -> None:
+        self._buffer.clear()
+        self._scan = 0
+        self._discarding = False
+
+    def feed(self, data: bytes) -> list[str]:
+        "写入数据，返回新的完整行（已去除首尾空白，跳过空行）。"
+        buf = self._buffer
+        buf += data
+        lines: list[str] = []
+        start = 0
+        find = buf.find
+        with memoryview(buf) as view:
+            while True:
+                end = find(b"\n", self._scan)
+                if end < 0:
+                    break
+                if self._discarding:
+                    self._discarding = False
+                elif end - start > self.max_line_length:
+                    self.dropped += 1
+                else:
+                    line = str(view[start:end], self.encoding, self.errors).strip()
+                    if line:
+                        lines.append(line)
+                start = self._scan = end + 1
+
+        if len(buf) - start > self.max_line_length:
+            self.dropped += 1
+            self._discarding = True
+            start = len(buf)
+        if start:
+            del buf[:start]
+        self._scan = len(buf)
+        return lines
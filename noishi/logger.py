@@ -1,9 +1,13 @@
+import atexit
 import datetime
-from typing import Optional, cast
+import sys
+import threading
+from collections import deque
+from typing import Literal, Optional, TextIO, cast
 from enum import Enum
 import weakref
 
-from noishi import Context, Event
+from noishi import Context, Event, Lane, eventclass
 
 class LogLevel(Enum):
     DEBUG = 1
@@ -14,52 +18,166 @@ class LogLevel(Enum):
     def __str__(self):
         return self.name
 
+@eventclass
 class LogEvent(Event):
-    def __init__(self, level: LogLevel | str, message: str, timestamp: Optional[datetime.datetime] = None):
-        self.level = level
-        self.message = message
-        self.timestamp = timestamp or datetime.datetime.now()
+    level: LogLevel | str
+    message: str
+    timestamp: Optional[datetime.datetime] = None  # None 为创建时的当前时间
+
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = datetime.datetime.now()
 
     def __str__(self):
         return f"[{self.timestamp:%Y-%m-%d %H:%M:%S}] {self.level}: {self.message}"
 
 class Logger:
-    def __init__(self, ctx: Context, name: str = "root"):
+    """
+    低于 level 的日志在格式化与创建 LogEvent 之前丢弃。
+    message 可以带 %-格式参数，例如 `await logger.debug("URC: %s", line)`，只在需要输出时格式化。
+    """
+    def __init__(self, ctx: Context, name: str = "root", level: LogLevel = LogLevel.DEBUG):
         self.ctx = cast(Context, weakref.proxy(ctx))
         self.name = name
+        self.level = level
 
-    async def _log(self, level: LogLevel | str, message: str):
+    def is_enabled(self, level: LogLevel | str) -> bool:
+        "该级别的日志是否会输出，可用于跳过昂贵的参数计算。自定义（字符串）级别总是输出。"
+        return not isinstance(level, LogLevel) or level.value >= self.level.value
+
+    async def _log(self, level: LogLevel | str, message: str, *args):
+        if not self.is_enabled(level):
+            return
+        if args:
+            message = message % args
         await self.ctx.send_event(LogEvent(level, f"[{self.name}] {message}"))
 
-    async def debug(self, message: str):
-        return await self._log(LogLevel.DEBUG, message)
+    async def debug(self, message: str, *args):
+        return await self._log(LogLevel.DEBUG, message, *args)
+
+    async def info(self, message: str, *args):
+        return await self._log(LogLevel.INFO, message, *args)
+
+    async def warning(self, message: str, *args):
+        return await self._log(LogLevel.WARNING, message, *args)
+
+    async def error(self, message: str, *args):
+        return await self._log(LogLevel.ERROR, message, *args)
+
+class LogSink:
+    """
+    有界日志缓冲，由后台线程批量写出，事件循环中只做一次入队。
+    队列满时按 overflow 处理: "drop_oldest" 丢弃最旧的一条，"drop_newest" 丢弃新写入的一条。
+    写线程是守护线程，进程退出时由 atexit 写出剩余日志，不必先注销。
+    """
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        capacity: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.1,
+        overflow: Literal["drop_oldest", "drop_newest"] = "drop_oldest",
+    ):
+        if overflow not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"未知的溢出策略 '{overflow}'，可选: drop_oldest, drop_newest。")
+        self.stream = stream or sys.stdout
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue: deque[str] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="noishi-log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.unregister)
+
+    def write(self, line: str) -> bool:
+        "写入一行，被丢弃时返回 False。"
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.capacity:
+                self.dropped += 1
+                if self.overflow == "drop_newest":
+                    return False
+                self._queue.popleft()
+            self._queue.append(line)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                if not self._queue:
+                    if self._closed:
+                        return
+                    continue
+                batch = list(self._queue)
+                self._queue.clear()
+            try:
+                self.stream.write("\n".join(batch) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError):
+                with self._cond:
+                    self.dropped += len(batch)
+                continue
+            with self._cond:
+                self.written += len(batch)
+                self.batches += 1
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+            }
 
-    async def info(self, message: str):
-        return await self._log(LogLevel.INFO, message)
+    def unregister(self, timeout: float = 1.0):
+        "停止后台线程，剩余日志写出后返回。"
+        atexit.unregister(self.unregister)
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
 
-    async def warning(self, message: str):
-        return await self._log(LogLevel.WARNING, message)
+_COLORS = {
+    LogLevel.DEBUG: "\033[94m",
+    LogLevel.INFO: "\033[92m",
+    LogLevel.WARNING: "\033[93m",
+    LogLevel.ERROR: "\033[91m",
+}
 
-    async def error(self, message: str):
-        return await self._log(LogLevel.ERROR, message)
+def apply(
+    ctx: Context,
+    level: LogLevel = LogLevel.DEBUG,
+    capacity: int = 10000,
+    overflow: Literal["drop_oldest", "drop_newest"] = "drop_oldest",
+):
+    sink = LogSink(capacity=capacity, overflow=overflow)
+    ctx.register("log_sink", sink)
+    # 控制台输出只是入队，直接在发送方任务中执行即可；日志走低优先级车道，不与串口写入争抢
+    ctx.set_event_policy(LogEvent, "inline")
+    ctx.set_event_lane(LogEvent, Lane.BULK)
 
-def apply(ctx: Context, level: LogLevel = LogLevel.DEBUG):
     @ctx.register_event_handler
     async def console_logger(event: LogEvent):
         if isinstance(event.level, LogLevel) and event.level.value < level.value:
             return
-        colors = {
-            LogLevel.DEBUG: "\033[94m",
-            LogLevel.INFO: "\033[92m",
-            LogLevel.WARNING: "\033[93m",
-            LogLevel.ERROR: "\033[91m",
-        }
         reset = "\033[0m"
-        color = colors.get(event.level, "\033[0m")
-        print(f"{color}{str(event)}{reset}")
+        color = _COLORS.get(event.level, "\033[0m")
+        sink.write(f"{color}{str(event)}{reset}")
 
     def get_logger(name: str = "root") -> Logger:
-        return Logger(ctx, name)
+        return Logger(ctx, name, level)
 
     ctx.register("logger", get_logger)
     return ctx
@@ -1,3 +1,10 @@
+import functools
+import itertools
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, Literal, NamedTuple
+import gsm0338  # noqa: F401  注册 gsm03.38 编解码器
 from noishi import Context
 from shua.struct.binary import BinaryStruct
 from shua.struct.field import UInt8, BytesField
@@ -39,50 +46,417 @@ def decode_sca(sca_bytes: bytes) -> str:
     number = decode_number(sca_bytes[2:2 + length - 1].hex().upper(), (length - 1) * 2)
     return ('+' + number) if typ == 0x91 else number
 
+_GROUP_MASK = (1 << 56) - 1
+
+@functools.lru_cache(maxsize=64)
+def _unpack_7bit_masks(groups: int) -> tuple[tuple[tuple[int, int], ...], tuple[int, ...]]:
+    """
+    生成 `groups` 个 7 字节组的 SWAR 掩码:
+    - 组展开: 按组序号二进制位从高到低，把第 g 组从第 56g 位整体移到第 64g 位
+    - 组内展开: 每组 56 位依次按 28/14/7 位拆半，最终每个 septet 占一个字节
+    """
+    spread = []
+    for j in reversed(range(groups.bit_length())):
+        step = 1 << j
+        mask = 0
+        for g in range(groups):
+            if g & step:
+                pos = 56 * g + 8 * (g & ~((step << 1) - 1))
+                mask |= _GROUP_MASK << pos
+        spread.append((mask, 8 * step))
+    repeat = ((1 << (64 * groups)) - 1) // ((1 << 64) - 1)
+    split = tuple(m * repeat for m in (
+        0x00FFFFFFF0000000, 0x0FFFC0000FFFC000, 0x3F803F803F803F80,
+    ))
+    return tuple(spread), split
+
 def unpack_7bit(data: bytes, length: int) -> bytes:
-    septets = []
-    carry = 0
-    carry_bits = 0
-
-    for b in data:
-        current = ((b << carry_bits) & 0x7F) | carry
-        septets.append(current)
-        carry = b >> (7 - carry_bits)
-        carry_bits += 1
-        if carry_bits == 7:
-            septets.append(carry)
-            carry_bits = 0
-            carry = 0
-
-    return bytes(septets[:length])
-
-def decode_7bit(data: bytes, length: int) -> str:
+    "解包 GSM 7-bit 数据。以 7 字节为一组，用大整数掩码一次处理整条消息。"
+    count = min(length, len(data) + len(data) // 7)
+    if count <= 0:
+        return b""
+
+    groups = (len(data) + 6) // 7
+    spread, (m28, m14, m7) = _unpack_7bit_masks(groups)
+    v = int.from_bytes(data, "little")
+    for mask, shift in spread:
+        moved = v & mask
+        v = (v ^ moved) | (moved << shift)
+    moved = v & m28
+    v = (v ^ moved) | (moved << 4)
+    moved = v & m14
+    v = (v ^ moved) | (moved << 2)
+    moved = v & m7
+    v = (v ^ moved) | (moved << 1)
+    return v.to_bytes(8 * groups, "little")[:count]
+
+def _build_gsm_tables() -> tuple[dict[int, str], dict[int, str]]:
+    "基于 gsm0338 编解码器生成基本表与扩展表（0x1B 转义）。"
+    basic = {i: bytes([i]).decode("gsm03.38") for i in range(128) if i != 0x1B}
+    extension = {}
+    for i in range(128):
+        try:
+            extension[i] = bytes([0x1B, i]).decode("gsm03.38")
+        except UnicodeDecodeError:
+            pass
+    basic[0x1B] = ""
+    return basic, extension
+
+GSM_BASIC_TABLE, GSM_EXTENSION_TABLE = _build_gsm_tables()
+_GSM_BASIC_TRANSLATE = str.maketrans(GSM_BASIC_TABLE)
+
+def decode_7bit(data: bytes, length: int, skip: int = 0) -> str:
+    "解码 GSM 7-bit 文本，skip 为跳过的前导 septet 数（用户数据头及填充位）。"
     septets = unpack_7bit(data, length)
-    import gsm0338 # noqa: F401
-    return septets.decode("gsm03.38")
+    if skip:
+        septets = septets[skip:]
+    if 0x1B not in septets:
+        return septets.decode("latin-1").translate(_GSM_BASIC_TRANSLATE)
+    head, *escaped = septets.split(b"\x1b")
+    parts = [head.decode("latin-1").translate(_GSM_BASIC_TRANSLATE)]
+    for part in escaped:
+        if part:
+            # 扩展表中不存在的字符按 3GPP TS 23.038 退回基本表
+            parts.append(GSM_EXTENSION_TABLE.get(part[0]) or GSM_BASIC_TABLE[part[0]])
+            parts.append(part[1:].decode("latin-1").translate(_GSM_BASIC_TRANSLATE))
+    return "".join(parts)
 
-def decode_pdu(pdu_hex: str) -> tuple[str, str, str, str]:
+class ConcatInfo(NamedTuple):
+    "长短信分段信息（IEI 0x00 / 0x08）。"
+    reference: int
+    total: int
+    sequence: int
+
+class Pdu(NamedTuple):
+    sca_number: str
+    sender: str
+    text: str
+    text_type: str
+    concat: ConcatInfo | None = None
+
+def parse_udh(header: bytes | memoryview) -> ConcatInfo | None:
+    "解析用户数据头（不含 UDHL），返回其中的分段信息。"
+    pos = 0
+    concat = None
+    while pos + 2 <= len(header):
+        iei, iel = header[pos], header[pos + 1]
+        value = header[pos + 2:pos + 2 + iel]
+        if iei == 0x00 and iel == 3:
+            concat = ConcatInfo(value[0], value[1], value[2])
+        elif iei == 0x08 and iel == 4:
+            concat = ConcatInfo((value[0] << 8) | value[1], value[2], value[3])
+        pos += 2 + iel
+    return concat
+
+def decode_user_data(
+    dcs: int, udl: int, user_data: bytes | memoryview, udhi: bool = False,
+) -> tuple[str, str, ConcatInfo | None]:
+    "按 DCS 解码用户数据，返回 (正文, 编码类型, 分段信息)。udhi 为真时先剥离用户数据头。"
+    concat = None
+    header_len = 0
+    if udhi and user_data:
+        header_len = 1 + user_data[0]
+        concat = parse_udh(user_data[1:header_len])
+    if dcs == 8:
+        return str(user_data[header_len:], 'utf-16-be'), "UCS2", concat
+    elif dcs & 0x0C == 0x00:
+        # 用户数据头之后填充到 septet 边界
+        return decode_7bit(user_data, udl, (header_len * 8 + 6) // 7), "GSM7BIT", concat
+    elif dcs & 0x0C == 0x04:
+        return str(user_data[header_len:], 'latin-1'), "8BIT", concat
+    else:
+        return user_data[header_len:].hex(), "null", concat
+
+def parse_pdu(pdu_hex: str) -> Pdu:
+    "基于 BinaryStruct 的参考实现。"
     data = bytes.fromhex(pdu_hex)
     sca_len = data[0]
     sca_number = decode_sca(data[:1 + sca_len])
     tpdu = TPDU.parse(data[1 + sca_len:])
     sender_number = decode_number(tpdu.sender_number.hex().upper(), tpdu.sender_length)
     sender = ('+' + sender_number) if tpdu.sender_type == 0x91 else sender_number
+    text, text_type, concat = decode_user_data(tpdu.dcs, tpdu.udl, tpdu.user_data, bool(tpdu.first_octet & 0x40))
+    return Pdu(sca_number, sender, text, text_type, concat)
 
-    if tpdu.dcs == 8:
-        text_type = "UCS2"
-        text = tpdu.user_data.decode('utf-16-be')
-    elif tpdu.dcs & 0x0C == 0x00:
-        text_type = "GSM7BIT"
-        text = decode_7bit(tpdu.user_data, tpdu.udl)
-    elif tpdu.dcs & 0x0C == 0x04:
-        text = tpdu.user_data.decode('latin-1')
-        text_type = "8BIT"
+def decode_pdu(pdu_hex: str) -> tuple[str, str, str, str]:
+    sca_number, sender, text, text_type, _ = parse_pdu(pdu_hex)
+    return sca_number, sender, text, text_type
+
+# 字节 -> 交换半字节后的两位十六进制字符，例如 0x21 -> "12"
+_BCD_SWAP = tuple(f"{b & 0x0F:X}{b >> 4:X}" for b in range(256))
+
+def decode_bcd(data: bytes | memoryview, length: int) -> str:
+    return "".join([_BCD_SWAP[b] for b in data]).rstrip('F')[:length]
+
+def parse_pdu_fast(pdu_hex: str) -> Pdu:
+    "手写解析，直接在 memoryview 上按偏移读取字段，结果与 parse_pdu 一致。"
+    data = bytes.fromhex(pdu_hex)
+    view = memoryview(data)
+    size = len(data)
+
+    sca_len = data[0]
+    if sca_len == 0:
+        sca_number = ''
     else:
-        text_type = "null"
-        text = tpdu.user_data.hex()
+        if size < 1 + sca_len:
+            raise ValueError("PDU 数据不完整: 短信中心号码")
+        sca_number = decode_bcd(view[2:1 + sca_len], (sca_len - 1) * 2)
+        if data[1] == 0x91:
+            sca_number = '+' + sca_number
+
+    pos = 1 + sca_len
+    if size < pos + 3:
+        raise ValueError("PDU 数据不完整: 发送者号码")
+    sender_length = data[pos + 1]
+    sender_type = data[pos + 2]
+    number_end = pos + 3 + (sender_length + 1) // 2
+    if size < number_end + 10:
+        raise ValueError("PDU 数据不完整: 协议头")
+    sender = decode_bcd(view[pos + 3:number_end], sender_length)
+    if sender_type == 0x91:
+        sender = '+' + sender
 
+    dcs = data[number_end + 1]
+    udl = data[number_end + 9]
+    ud_start = number_end + 10
+    ud_end = ud_start + ((udl * 7 + 7) // 8 if dcs & 0x0C == 0x00 else udl)
+    if size < ud_end:
+        raise ValueError(f"PDU 数据不完整: 用户数据需要 {ud_end - ud_start} 字节，实际 {size - ud_start} 字节")
+    text, text_type, concat = decode_user_data(dcs, udl, view[ud_start:ud_end], bool(data[pos] & 0x40))
+    return Pdu(sca_number, sender, text, text_type, concat)
+
+def decode_pdu_fast(pdu_hex: str) -> tuple[str, str, str, str]:
+    sca_number, sender, text, text_type, _ = parse_pdu_fast(pdu_hex)
     return sca_number, sender, text, text_type
 
-def apply(ctx: Context):  
-    return ctx.register('pdu').register('decode',decode_pdu)
+PDU_PARSERS = {
+    "fast": parse_pdu_fast,
+    "struct": parse_pdu,
+}
+
+class DecodeResult(NamedTuple):
+    "批量解码的单条结果，position 为在输入中的序号，value 与 error 有且只有一个不为 None。"
+    position: int
+    pdu: str
+    value: Pdu | None
+    error: Exception | None
+
+def _decode_chunk(parser: str, start: int, chunk: list[str]) -> list[DecodeResult]:
+    decode = PDU_PARSERS[parser]
+    results = []
+    for position, item in enumerate(chunk, start):
+        try:
+            results.append(DecodeResult(position, item, decode(item), None))
+        except Exception as e:
+            results.append(DecodeResult(position, item, None, e))
+    return results
+
+def decode_many(
+    pdus: Iterable[str],
+    *,
+    parser: str = "fast",
+    executor: Literal["thread", "process"] | Executor | None = None,
+    workers: int | None = None,
+    chunk_size: int = 1000,
+) -> Iterator[DecodeResult]:
+    """
+    批量解码，按输入顺序逐条产出 DecodeResult，单条失败不会中断整批。
+    - executor 为 None 时在当前线程解码
+    - "thread" / "process" 时按 chunk_size 分块提交到新建的线程池/进程池，用完即关闭
+    - 也可以传入已有的 Executor（不会被关闭）
+    提交窗口为 workers 的两倍，输入可以是任意长的迭代器。
+    """
+    if parser not in PDU_PARSERS:
+        raise ValueError(f"未知的 PDU 解析器 '{parser}'，可选: {', '.join(PDU_PARSERS)}。")
+    if executor is None:
+        decode = PDU_PARSERS[parser]
+        for position, item in enumerate(pdus):
+            try:
+                yield DecodeResult(position, item, decode(item), None)
+            except Exception as e:
+                yield DecodeResult(position, item, None, e)
+    else:
+        yield from _decode_many_pooled(pdus, parser, executor, workers, chunk_size)
+
+def _decode_many_pooled(
+    pdus: Iterable[str],
+    parser: str,
+    executor: Literal["thread", "process"] | Executor,
+    workers: int | None,
+    chunk_size: int,
+) -> Iterator[DecodeResult]:
+    workers = workers or os.cpu_count() or 1
+    if executor == "thread":
+        pool, owned = ThreadPoolExecutor(workers), True
+    elif executor == "process":
+        pool, owned = ProcessPoolExecutor(workers), True
+    elif isinstance(executor, Executor):
+        pool, owned = executor, False
+    else:
+        raise ValueError(f"未知的执行器 '{executor}'，可选: thread, process 或 Executor 实例。")
+
+    iterator = iter(pdus)
+    pending: deque[Future[list[DecodeResult]]] = deque()
+    start = 0
+    try:
+        while True:
+            while len(pending) < workers * 2:
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_decode_chunk, parser, start, chunk))
+                start += len(chunk)
+            if not pending:
+                return
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if owned:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+# ---------------------- 编码 ----------------------
+# 字符 -> septet（扩展表字符为 0x1B 加代码），基本表优先
+_GSM_ENCODE_TRANSLATE = str.maketrans(
+    {ch: "\x1b" + chr(code) for code, ch in GSM_EXTENSION_TABLE.items()}
+    | {ch: chr(code) for code, ch in GSM_BASIC_TABLE.items() if ch}
+)
+GSM7_CHARS = frozenset(ch for ch in GSM_BASIC_TABLE.values() if ch) | frozenset(GSM_EXTENSION_TABLE.values())
+
+def encode_7bit(text: str) -> bytes | None:
+    "把文本转换为 septet（每字节一个，扩展字符占两个），含 GSM 7-bit 无法表示的字符时返回 None。"
+    if not GSM7_CHARS.issuperset(text):
+        return None
+    return text.translate(_GSM_ENCODE_TRANSLATE).encode("latin-1")
+
+def pack_7bit(septets: bytes) -> bytes:
+    "打包 GSM 7-bit 数据，unpack_7bit 的逆运算：按相同的掩码表逆序把每 8 个 septet 压缩为 7 字节。"
+    count = len(septets)
+    if count == 0:
+        return b""
+    groups = (count + 7) // 8
+    spread, (m28, m14, m7) = _unpack_7bit_masks(groups)
+    v = int.from_bytes(septets, "little")
+    moved = v & (m7 << 1)
+    v = (v ^ moved) | (moved >> 1)
+    moved = v & (m14 << 2)
+    v = (v ^ moved) | (moved >> 2)
+    moved = v & (m28 << 4)
+    v = (v ^ moved) | (moved >> 4)
+    for mask, shift in reversed(spread):
+        moved = v & (mask << shift)
+        v = (v ^ moved) | (moved >> shift)
+    return v.to_bytes(7 * groups, "little")[:(count * 7 + 7) // 8]
+
+def encode_bcd(digits: str) -> bytes:
+    "号码转为交换半字节的 BCD，奇数位补 F。"
+    if len(digits) % 2:
+        digits += "F"
+    return bytes.fromhex("".join(digits[i + 1] + digits[i] for i in range(0, len(digits), 2)))
+
+def encode_address(number: str) -> bytes:
+    "TP-DA: 数字个数、号码类型（以 + 开头为国际号码 0x91，否则 0x81）与 BCD 号码。"
+    international = number.startswith("+")
+    digits = number[1:] if international else number
+    if not digits or not all(c in "0123456789*#" for c in digits):
+        raise ValueError(f"无效的号码 {number!r}")
+    digits = digits.replace("*", "A").replace("#", "B")
+    return bytes((len(digits), 0x91 if international else 0x81)) + encode_bcd(digits)
+
+def encode_sca(number: str | None) -> bytes:
+    "短信中心号码，None 或空表示使用 SIM 卡中的设置。"
+    if not number:
+        return b"\x00"
+    address = encode_address(number)
+    return bytes((len(address) - 1,)) + address[1:]
+
+# 单条与分段时每段的最大长度（GSM 7-bit 为 septet 数，UCS2 为字节数），分段时用户数据头占 6 字节
+_GSM7_SINGLE, _GSM7_SEGMENT = 160, 153
+_UCS2_SINGLE, _UCS2_SEGMENT = 140, 134
+
+def _split_7bit(septets: bytes) -> list[bytes]:
+    parts = []
+    while septets:
+        end = _GSM7_SEGMENT
+        if len(septets) > end and septets[end - 1] == 0x1B:  # 不拆开转义序列
+            end -= 1
+        parts.append(septets[:end])
+        septets = septets[end:]
+    return parts
+
+def _split_ucs2(data: bytes) -> list[bytes]:
+    parts = []
+    while data:
+        end = _UCS2_SEGMENT
+        if len(data) > end and 0xD8 <= data[end - 2] <= 0xDB:  # 不拆开代理对
+            end -= 2
+        parts.append(data[:end])
+        data = data[end:]
+    return parts
+
+class SubmitPdu(NamedTuple):
+    "SMS-SUBMIT PDU，tpdu_length 为 AT+CMGS 所需的长度（不含短信中心号码）。"
+    pdu: str
+    tpdu_length: int
+
+_concat_reference = itertools.count(int.from_bytes(os.urandom(1), "big"))
+
+def encode_submit(
+    number: str,
+    text: str,
+    *,
+    sca: str | None = None,
+    ucs2: bool | None = None,
+    reference: int | None = None,
+) -> list[SubmitPdu]:
+    """
+    编码 SMS-SUBMIT，超长时自动分段（8 位参考号的用户数据头）。
+    ucs2 为 None 时能用 GSM 7-bit 表示则用 7-bit，否则用 UCS2。reference 默认自增。
+    """
+    septets = None if ucs2 else encode_7bit(text)
+    if septets is None and ucs2 is False:
+        raise ValueError("文本包含 GSM 7-bit 无法表示的字符。")
+    if septets is not None:
+        dcs = 0x00
+        parts = [septets] if len(septets) <= _GSM7_SINGLE else _split_7bit(septets)
+    else:
+        dcs = 0x08
+        data = text.encode("utf-16-be")
+        parts = [data] if len(data) <= _UCS2_SINGLE else _split_ucs2(data)
+    if len(parts) > 255:
+        raise ValueError(f"文本过长，需要 {len(parts)} 段，最多 255 段。")
+
+    head = encode_sca(sca)
+    address = encode_address(number)
+    concat = len(parts) > 1
+    if concat:
+        reference = (next(_concat_reference) if reference is None else reference) & 0xFF
+
+    result = []
+    for sequence, part in enumerate(parts, 1):
+        if not concat:
+            first_octet = 0x01
+            user_data = pack_7bit(part) if dcs == 0x00 else part
+            udl = len(part)
+        else:
+            first_octet = 0x41  # SMS-SUBMIT + UDHI
+            udh = bytes((0x05, 0x00, 0x03, reference, len(parts), sequence))
+            if dcs == 0x00:
+                # 用户数据头 6 字节加 1 位填充恰好占 7 个 septet
+                user_data = udh + pack_7bit(b"\x00" * 7 + part)[6:]
+                udl = 7 + len(part)
+            else:
+                user_data = udh + part
+                udl = len(user_data)
+        tpdu = bytes((first_octet, 0x00)) + address + bytes((0x00, dcs, udl)) + user_data
+        result.append(SubmitPdu((head + tpdu).hex().upper(), len(tpdu)))
+    return result
+
+def apply(ctx: Context, parser: str = "fast"):
+    if parser not in PDU_PARSERS:
+        raise ValueError(f"未知的 PDU 解析器 '{parser}'，可选: {', '.join(PDU_PARSERS)}。")
+    pdu = ctx.register('pdu')
+    pdu.register('parse', PDU_PARSERS[parser])
+    pdu.register('decode_many', functools.partial(decode_many, parser=parser))
+    pdu.register('encode', encode_submit)
+    return pdu.register('decode', decode_pdu_fast if parser == "fast" else decode_pdu)
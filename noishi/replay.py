@@ -0,0 +1,140 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple
+from noishi import Context, Lane, Service
+from noishi.event.serial import SerialDataReceived, SerialDataSent, SerialWriteRequest
+from noishi.filelog import encode_binary, read_records
+
+class CaptureChunk(NamedTuple):
+    "采集到的一块串口数据，offset 为相对第一块的秒数。"
+    offset: float
+    port: str
+    data: bytes
+
+def load_capture(path: str | Path, port: str | None = None) -> list[CaptureChunk]:
+    """
+    读取采集文件中的 SerialDataReceived 记录，可按端口筛选。
+    采集文件即 filelog 的记录格式，filelog 写出的日志段（含 .gz）也可以直接回放。
+    """
+    chunks = []
+    first = None
+    for record in read_records(path):
+        if record["type"] != "SerialDataReceived" or (port is not None and record["port"] != port):
+            continue
+        if first is None:
+            first = record["ts"]
+        chunks.append(CaptureChunk(record["ts"] - first, record["port"], record["data"]))
+    return chunks
+
+def write_capture(path: str | Path, chunks: Iterable[CaptureChunk], start: float = 0.0):
+    "把数据块写为二进制采集文件。"
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(encode_binary("SerialDataReceived", start + chunk.offset, SerialDataReceived(chunk.port, chunk.data)))
+
+class CaptureRecorder(Service[Context]):
+    "把收到的串口数据追加写入采集文件，供 ReplaySerialService 回放。"
+    def __init__(self, ctx: Context, path: str | Path, port: str | None = None):
+        super().__init__(ctx)
+        self.path = Path(path)
+        self.port = port
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        ctx.register_event_handler(self.handle_rx, policy="inline")
+
+    async def handle_rx(self, event: SerialDataReceived):
+        if self.port is None or event.port == self.port:
+            self._file.write(encode_binary("SerialDataReceived", time.time(), event))
+
+    def unregister(self):
+        self.ctx.unregister_event_handler(self.handle_rx)
+        self._file.close()
+
+class ReplaySerialService(Service[Context]):
+    """
+    SerialPool 的单端口替身：把采集的数据块按顺序作为 SerialDataReceived 发出，提供 port、ports 等与 SerialPool 相同的接口。
+    - 数据块一律以 port（默认为第一块的端口）发出，多端口采集请先用 load_capture(path, port) 筛选
+    - speed 为 None 时尽快回放，否则按原始间隔除以 speed 回放（1.0 为原速），按开始时间对齐，不累积误差
+    - 写入只发出 SerialDataSent；respond 可根据写入内容返回模拟的应答数据
+    - 全部数据块的处理链（不含 fire-and-forget 处理器）结束后 finished 被置位
+    """
+    def __init__(
+        self,
+        ctx: Context,
+        capture: str | Path | Iterable[CaptureChunk],
+        port: str | None = None,
+        speed: float | None = 1.0,
+        respond: Callable[[bytes], bytes | None] | None = None,
+    ):
+        super().__init__(ctx)
+        if speed is not None and speed <= 0:
+            raise ValueError("speed 必须大于 0。")
+        self.chunks = load_capture(capture) if isinstance(capture, (str, Path)) else list(capture)
+        if port is None and not self.chunks:
+            raise ValueError("采集为空，且未指定端口。")
+        self.port = port or self.chunks[0].port
+        self.speed = speed
+        self.respond = respond
+        self.chunks_sent = 0
+        self.bytes_sent = 0
+        self.elapsed = 0.0
+        self.finished = asyncio.Event()
+        self._running = True
+        ctx.register_event_handler(self.handle_write)
+        self._task = asyncio.create_task(self.replay())
+
+    @property
+    def ports(self) -> list[str]:
+        return [self.port]
+
+    def __contains__(self, port: str) -> bool:
+        return port == self.port
+
+    def __len__(self) -> int:
+        return 1
+
+    async def handle_write(self, event: SerialWriteRequest):
+        if event.port != self.port or not self._running:
+            return
+        await self.ctx.send_event(SerialDataSent(self.port, event.data))
+        if self.respond is not None:
+            reply = self.respond(event.data)
+            if reply:
+                await self.ctx.send_event(SerialDataReceived(self.port, reply))
+
+    async def replay(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for chunk in self.chunks:
+            if not self._running:
+                break
+            if self.speed is not None:
+                delay = start + chunk.offset / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.ctx.send_event(SerialDataReceived(self.port, chunk.data))
+            self.chunks_sent += 1
+            self.bytes_sent += len(chunk.data)
+        self.elapsed = loop.time() - start
+        self.finished.set()
+
+    async def wait(self) -> float:
+        "等待回放结束，返回耗时。"
+        await self.finished.wait()
+        return self.elapsed
+
+    def unregister(self):
+        self._running = False
+        self._task.cancel()
+        self.ctx.unregister_event_handler(self.handle_write)
+
+def apply(
+    ctx: Context,
+    capture: str | Path | Iterable[CaptureChunk],
+    port: str | None = None,
+    speed: float | None = 1.0,
+    respond: Callable[[bytes], bytes | None] | None = None,
+):
+    ctx.set_event_lane(SerialWriteRequest, Lane.HIGH, ordered=True)
+    ctx.register("serial", ReplaySerialService(ctx, capture, port, speed, respond))
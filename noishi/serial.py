@@ -1,49 +1,296 @@
 import asyncio
+import random
+import traceback
 import serial_asyncio
 import weakref
-from noishi import Context, Service
-from noishi.event.serial import SerialDataSent, SerialDataReceived, SerialWriteRequest
+from collections import deque
+from typing import Iterable
+from noishi import Context, Lane, Service
+from noishi.event.serial import SerialConnected, SerialDataSent, SerialDataReceived, SerialDisconnected, SerialWriteRequest
 
 class SerialService(Service[Context]):
-    def __init__(self, ctx: Context, port: str, baudrate: int = 115200):
+    """
+    单个串口连接，写入由 SerialPool 按端口分发。
+    - 连接由监督任务维护：打开失败或连接断开后都按指数退避（带随机抖动）等待再重连，
+      连接稳定（AT 探测成功或持续 stable_after 秒）后退避时间才复位，反复断开的端口不会形成忙循环
+    - 断开期间的写入进入有界缓冲（超出 max_pending 时丢弃最旧的），重连后按序写出，已过 deadline 的写入丢弃
+    - probe_interval 不为 None 且注册了 at 模块时，定期发送 AT 探测，连续 probe_failures 次失败则主动重连
+    """
+    def __init__(
+        self,
+        ctx: Context,
+        port: str,
+        baudrate: int = 115200,
+        high_water: int = 64 * 1024,
+        low_water: int = 16 * 1024,
+        max_batch: int = 4096,
+        reconnect_initial: float = 0.5,
+        reconnect_max: float = 30.0,
+        max_pending: int = 256,
+        probe_interval: float | None = 30.0,
+        probe_timeout: float = 2.0,
+        probe_failures: int = 2,
+        stable_after: float = 10.0,
+    ):
         super().__init__(ctx)
+        if not 0 <= low_water <= high_water:
+            raise ValueError("low_water 必须在 0 和 high_water 之间。")
         self.port = port
         self.baudrate = baudrate
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_batch = max_batch
+        self.reconnect_initial = reconnect_initial
+        self.reconnect_max = reconnect_max
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.probe_failures = probe_failures
+        self.stable_after = stable_after
+        self.reconnects = 0
+        self.dropped = 0
+        self.expired = 0
+        self._stable = False
         self._running = True
         self.transport = None
         self.protocol = None
-        ctx.register_event_handler(self.handle_write)
-        asyncio.create_task(self.start_serial())
-        
-    async def handle_write(self,event: SerialWriteRequest):
-        if event.port == self.port and self.transport:
-            self.transport.write(event.data)
-            await self.ctx.send_event(SerialDataSent(self.port, event.data))
-            
+        self._pending: deque[tuple[bytes, float | None]] = deque(maxlen=max_pending)
+        self._draining: set[asyncio.Task] = set()  # 断开后仍在送出已排队数据的消费者
+        self._lost = asyncio.Event()
+        self._at_send = ctx.bind("at.send")
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    @property
+    def connected(self) -> bool:
+        return self.transport is not None
+
+    async def write(self, data: bytes, deadline: float | None = None):
+        "deadline 为事件循环时间，断开期间缓冲的写入到重连时已过期则丢弃。"
+        if self.transport:
+            self.transport.write(data)
+            await self.ctx.send_event(SerialDataSent(self.port, data))
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append((data, deadline))
+
     async def start_serial(self):
         loop = asyncio.get_running_loop()
         self.transport, self.protocol = await serial_asyncio.create_serial_connection(
             loop, lambda: SerialProtocol(self), self.port, baudrate=self.baudrate
         )
 
+    def _connection_lost(self):
+        self.transport = None
+        self.protocol = None
+        self._lost.set()
+
+    async def _supervise(self):
+        loop = asyncio.get_running_loop()
+        delay = self.reconnect_initial
+        while self._running:
+            try:
+                await self.start_serial()
+            except Exception as e:  # serial.SerialException 也是 OSError，其他异常同样退避后重试
+                if not isinstance(e, OSError):
+                    traceback.print_exc()
+                await self.ctx.send_event(SerialDisconnected(self.port, repr(e)))
+            else:
+                self._lost.clear()
+                if self.transport is not None:  # 否则为打开后立即断开
+                    opened = loop.time()
+                    await self._serve_connection(loop)
+                    if self._stable or loop.time() - opened >= self.stable_after:
+                        delay = self.reconnect_initial
+                    if self._running:
+                        self.reconnects += 1
+                        await self.ctx.send_event(SerialDisconnected(self.port, "连接断开"))
+            if not self._running:
+                return
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def _serve_connection(self, loop: asyncio.AbstractEventLoop):
+        "写出断开期间缓冲的数据并发出 SerialConnected，然后等待连接断开。"
+        assert self.transport is not None
+        self._stable = False
+        # 先同步写出缓冲的数据，保证先于新的写入；过期的写入（如已超时的 AT 命令）不再写出
+        now = loop.time()
+        pending = []
+        for data, deadline in self._pending:
+            if deadline is not None and deadline <= now:
+                self.expired += 1
+            else:
+                pending.append(data)
+        self._pending.clear()
+        for data in pending:
+            self.transport.write(data)
+        await self.ctx.send_event(SerialConnected(self.port, self.reconnects))
+        for data in pending:
+            await self.ctx.send_event(SerialDataSent(self.port, data))
+
+        probe = asyncio.create_task(self._probe()) if self.probe_interval is not None else None
+        try:
+            await self._lost.wait()
+        finally:
+            if probe is not None:
+                probe.cancel()
+
+    async def _probe(self):
+        failures = 0
+        while True:
+            await asyncio.sleep(self.probe_interval)  # type: ignore[arg-type]
+            try:
+                at_send = self._at_send.target
+            except ValueError:
+                continue  # 没有注册 at 模块
+            try:
+                await at_send("AT", port=self.port, timeout=self.probe_timeout)
+                failures = 0
+                self._stable = True
+            except Exception:
+                failures += 1
+                if failures >= self.probe_failures and self.transport is not None:
+                    self.transport.close()  # connection_lost 触发重连
+                    return
+
     def unregister(self):
         self._running = False
+        self._supervisor.cancel()
         if self.transport:
             self.transport.close()
+
+class SerialPool(Service[Context]):
+    """
+    串口池：管理多个端口（例如 USB 集线器上的一组调制解调器），注册为 "serial"。
+    只注册一个 SerialWriteRequest 处理器，按端口名查表分发，开销与端口数无关。
+    port 为第一个端口，只有一个端口时与单个 SerialService 的用法相同。
+    """
+    def __init__(self, ctx: Context, ports: Iterable[str], **options):
+        super().__init__(ctx)
+        self.options = options
+        self.services: dict[str, SerialService] = {}
+        for port in ports:
+            self.add_port(port)
+        if not self.services:
+            raise ValueError("串口池至少需要一个端口。")
+        ctx.register_event_handler(self.handle_write)
+
+    @property
+    def port(self) -> str:
+        return next(iter(self.services))
+
+    @property
+    def ports(self) -> list[str]:
+        return list(self.services)
+
+    def __getitem__(self, port: str) -> SerialService:
+        return self.services[port]
+
+    def __contains__(self, port: str) -> bool:
+        return port in self.services
+
+    def __len__(self) -> int:
+        return len(self.services)
+
+    def add_port(self, port: str, **options) -> SerialService:
+        "打开新端口，options 覆盖池的默认参数。"
+        if port in self.services:
+            raise ValueError(f"端口 {port} 已在串口池中。")
+        service = self.services[port] = SerialService(self.ctx, port, **{**self.options, **options})
+        return service
+
+    def remove_port(self, port: str):
+        self.services.pop(port).unregister()
+
+    async def handle_write(self, event: SerialWriteRequest):
+        service = self.services.get(event.port)
+        if service is not None:
+            await service.write(event.data, event.deadline)
+
+    def unregister(self):
         self.ctx.unregister_event_handler(self.handle_write)
+        for service in self.services.values():
+            service.unregister()
 
 class SerialProtocol(asyncio.Protocol):
+    "串口协议：接收数据进入有界队列，由单个消费者按序合并后发送 SerialDataReceived，连接断开后仍送完已排队的数据。"
     def __init__(self, service: SerialService):
         self.service_ref = weakref.ref(service)
-        self.buffer = bytearray()
+        self.transport: asyncio.Transport | None = None
+        self._chunks: deque[bytes] = deque()
+        self._queued = 0
+        self._paused = False
+        self._wakeup = asyncio.Event()
+        self._consumer: asyncio.Task | None = None
+        self._closed = False
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        self.transport = transport  # type: ignore[assignment]
+        self._consumer = asyncio.create_task(self._consume())
+
+    def connection_lost(self, exc: Exception | None):
+        # 已收到的数据仍由消费者送达处理器（断线前的 +CMTI、OK 或 PDU 不能丢），只有服务注销时才丢弃
+        self.transport = None
+        self._closed = True
+        self._wakeup.set()
+        service = self.service_ref()
+        consumer, self._consumer = self._consumer, None
+        if consumer is not None and not consumer.done():
+            if service is None or not service._running:
+                consumer.cancel()
+            else:
+                # 事件循环只弱引用任务，送完之前由服务持有
+                service._draining.add(consumer)
+                consumer.add_done_callback(service._draining.discard)
+        if service is not None and service.protocol is self:
+            service._connection_lost()
 
     def data_received(self, data: bytes):
-        self.buffer.extend(data)
         service = self.service_ref()
-        if service is not None and service._running:
-            asyncio.create_task(service.ctx.send_event(
-                SerialDataReceived(service.port, bytes(data))
-            ))
+        if service is None or not service._running or self._closed:
+            return
+        self._chunks.append(bytes(data))
+        self._queued += len(data)
+        self._wakeup.set()
+        if not self._paused and self._queued >= service.high_water and self.transport is not None:
+            self._paused = True
+            self.transport.pause_reading()
+
+    def _take_batch(self, max_batch: int) -> bytes:
+        "取出队首相邻数据块合并为一批，至少取一块。"
+        chunks = self._chunks
+        batch = [chunks.popleft()]
+        size = len(batch[0])
+        while chunks and size + len(chunks[0]) <= max_batch:
+            chunk = chunks.popleft()
+            batch.append(chunk)
+            size += len(chunk)
+        self._queued -= size
+        return batch[0] if len(batch) == 1 else b"".join(batch)
+
+    async def _consume(self):
+        while not (self._closed and not self._chunks):
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._chunks:
+                service = self.service_ref()
+                if service is None or not service._running:
+                    self._chunks.clear()
+                    self._queued = 0
+                    return
+                data = self._take_batch(service.max_batch)
+                if self._paused and self._queued <= service.low_water and self.transport is not None:
+                    self._paused = False
+                    self.transport.resume_reading()
+                try:
+                    await service.ctx.send_event(SerialDataReceived(service.port, data))
+                except Exception:
+                    traceback.print_exc()
+                del service  # 等待期间不持有服务的强引用
 
-def apply(ctx: Context, port: str, baudrate: int = 115200):
-    ctx.register("serial", SerialService(ctx, port, baudrate))
+def apply(ctx: Context, port: str | Iterable[str], baudrate: int = 115200, **options):
+    "port 可以是单个端口或端口列表，其余参数见 SerialService。"
+    ports = [port] if isinstance(port, str) else list(port)
+    # 写请求优先于日志等批量事件，并按发送顺序逐个写出
+    ctx.set_event_lane(SerialWriteRequest, Lane.HIGH, ordered=True)
+    ctx.register("serial", SerialPool(ctx, ports, baudrate=baudrate, **options))
@@ -0,0 +1,515 @@
+import asyncio
+import concurrent.futures
+import importlib
+import inspect
+import itertools
+import multiprocessing
+import pickle
+import queue
+import threading
+import traceback
+import types
+from collections import deque
+from typing import Any, Callable, Iterable
+from noishi import Context, Event, Service
+
+_PROTOCOL = pickle.HIGHEST_PROTOCOL
+_MAX_BATCH = 512
+
+# ---------------------- 管道 ----------------------
+def _write_loop(conn, outbox: queue.SimpleQueue):
+    "写线程：把队列中积压的消息合并为一批，一次序列化、一次写入。None 表示结束。"
+    while True:
+        message = outbox.get()
+        if message is None:
+            return
+        batch = [message]
+        while len(batch) < _MAX_BATCH:
+            try:
+                message = outbox.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                outbox.put(None)
+                break
+            batch.append(message)
+        try:
+            data = pickle.dumps(batch, _PROTOCOL)
+        except Exception:
+            data = pickle.dumps([m for m in map(_picklable, batch) if m is not None], _PROTOCOL)
+        try:
+            conn.send_bytes(data)
+        except (OSError, EOFError):
+            return
+
+def _picklable(message: tuple) -> tuple | None:
+    "单独序列化失败的消息：调用结果替换为错误，事件丢弃。"
+    try:
+        pickle.dumps(message, _PROTOCOL)
+        return message
+    except Exception as e:
+        if message[0] == "result":
+            return ("result", message[1], False, RuntimeError(f"结果无法序列化: {e!r}"))
+        traceback.print_exc()
+        return None
+
+def _read_loop(conn, deliver):
+    """
+    读线程：逐批反序列化后交给 deliver，管道关闭时以 None 调用。
+    无法反序列化的一批以 [("lost", 异常)] 交给 deliver，读线程继续读取。
+    """
+    while True:
+        try:
+            data = conn.recv_bytes()
+        except (OSError, EOFError):
+            deliver(None)
+            return
+        try:
+            batch = pickle.loads(data)
+        except Exception as e:
+            traceback.print_exc()
+            batch = [("lost", e)]
+        deliver(batch)
+
+def _start_threads(conn, deliver) -> tuple[queue.SimpleQueue, threading.Thread]:
+    "启动读写线程，返回写队列与写线程（关闭时放入 None 并等待写线程写完）。"
+    outbox: queue.SimpleQueue = queue.SimpleQueue()
+    writer = threading.Thread(target=_write_loop, args=(conn, outbox), daemon=True)
+    writer.start()
+    threading.Thread(target=_read_loop, args=(conn, deliver), daemon=True).start()
+    return outbox, writer
+
+# ---------------------- 工作进程 ----------------------
+class ShardContext(Context):
+    "工作进程中的代理上下文：本地发出的事件在本地分发，同时转发给主进程。"
+    def __init__(self, outbox: queue.SimpleQueue):
+        super().__init__()
+        self._outbox = outbox
+
+    async def send_event(self, *events: Event, _direct: bool = False) -> None:
+        self._outbox.put(("event", events))
+        await super().send_event(*events, _direct=_direct)
+
+def _describe(ctx: Context, names: Iterable[str]) -> dict[str, Any]:
+    "描述注册的对象，供主进程建立镜像: 子上下文为字典，函数为 sync/async，其余为 object。"
+    tree: dict[str, Any] = {}
+    for name in names:
+        target = ctx._handler[name]
+        if isinstance(target, Context):
+            tree[name] = _describe(target, list(target._handler))
+        elif inspect.iscoroutinefunction(target):
+            tree[name] = "async"
+        elif callable(target):
+            tree[name] = "sync"
+        else:
+            tree[name] = "object"
+    return tree
+
+async def _serve(conn, module_name: str, args: tuple, kwargs: dict, preload: tuple[str, ...]):
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox, writer = _start_threads(conn, lambda batch: loop.call_soon_threadsafe(inbox.put_nowait, batch))
+    ctx = ShardContext(outbox)
+    try:
+        await _run(ctx, inbox, module_name, args, kwargs, preload)
+    finally:
+        ctx.unregister()
+        outbox.put(None)
+        writer.join()  # 写线程是守护线程，退出前等它写完（包括启动失败的错误）
+
+async def _run(ctx: ShardContext, inbox: asyncio.Queue, module_name: str, args: tuple, kwargs: dict, preload: tuple[str, ...]):
+    outbox = ctx._outbox
+    try:
+        for name in preload:
+            ctx.add_sub_module(importlib.import_module(name))
+        ctx.add_sub_module(importlib.import_module(module_name), *args, **kwargs)
+    except Exception as e:
+        outbox.put(("hello", [], {}, e))
+        return
+    names = ctx._module_info[module_name]["names"]
+    outbox.put(("hello", list(ctx._event_handler), _describe(ctx, names), None))
+
+    while True:
+        batch = await inbox.get()
+        if batch is None:
+            return
+        for message in batch:
+            kind = message[0]
+            if kind == "event":
+                # 来自主进程的事件只在本地分发，不再转发回去
+                await Context.send_event(ctx, *message[1])
+            elif kind == "call":
+                _, call_id, path, attr, call_args, call_kwargs = message
+                try:
+                    target = ctx.get(path)
+                    if attr is not None:
+                        target = getattr(target, attr)
+                    result = target(*call_args, **call_kwargs)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    elif inspect.isgenerator(result):
+                        result = list(result)  # 生成器无法跨进程，取完后返回列表
+                    outbox.put(("result", call_id, True, result))
+                except Exception as e:
+                    outbox.put(("result", call_id, False, e))
+            elif kind == "stop":
+                return
+            # "lost": 主进程发来的一批无法反序列化，其中的调用由主进程按超时处理
+
+def _worker_main(conn, module_name: str, args: tuple, kwargs: dict, preload: tuple[str, ...]):
+    asyncio.run(_serve(conn, module_name, args, kwargs, preload))
+
+# ---------------------- 主进程 ----------------------
+class RemoteCallable:
+    """
+    工作进程中函数的代理。
+    - 默认调用返回可等待对象，不阻塞事件循环；同步函数也是如此，调用方须 await（或经 Binding.acall 调用）
+    - blocking 为真时调用阻塞到结果返回，只应在事件循环之外使用
+    """
+    __slots__ = ("_shard", "path", "attr", "blocking")
+
+    def __init__(self, shard: 'ProcessShard', path: str, attr: str | None = None, blocking: bool = False):
+        self._shard = shard
+        self.path = path
+        self.attr = attr
+        self.blocking = blocking
+
+    def __call__(self, *args, **kwargs) -> Any:
+        shard = self._shard
+        call_id, future = shard._submit(self.path, self.attr, args, kwargs)
+        if not self.blocking:
+            return asyncio.ensure_future(shard._wait(call_id, future))
+        try:
+            return future.result(shard.call_timeout)
+        except concurrent.futures.TimeoutError:
+            shard._calls.pop(call_id, None)
+            raise
+
+    async def acall(self, *args, **kwargs) -> Any:
+        return await self._shard._wait(*self._shard._submit(self.path, self.attr, args, kwargs))
+
+    def __repr__(self) -> str:
+        return f"RemoteCallable({self.path!r}{'' if self.attr is None else f', {self.attr!r}'})"
+
+class RemoteObject:
+    "工作进程中对象的代理，方法调用按 RemoteCallable 转发。"
+    def __init__(self, shard: 'ProcessShard', path: str):
+        self._shard = shard
+        self._path = path
+
+    def __getattr__(self, attr: str) -> RemoteCallable:
+        if attr.startswith("_") or attr == "unregister":  # 生命周期由 ProcessShard 管理
+            raise AttributeError(attr)
+        return RemoteCallable(self._shard, self._path, attr, self._shard.blocking)
+
+class _Worker:
+    __slots__ = ("process", "conn", "outbox", "hello", "calls")
+
+    def __init__(self, process, conn, outbox):
+        self.process = process
+        self.conn = conn
+        self.outbox = outbox
+        self.hello: concurrent.futures.Future = concurrent.futures.Future()
+        self.calls: set[int] = set()  # 分配到该进程、尚未完成的调用
+
+class ProcessShard(Service[Context]):
+    """
+    在工作进程中运行子模块。
+    - 工作进程订阅的事件类型由主进程转发（序列化后批量经管道发送），工作进程发出的事件在主进程中再次分发
+    - 子模块注册的名称在主进程中以 RemoteCallable / RemoteObject 镜像（由 mount 注册，注销时一并移除），
+      其他模块照常通过 ctx 使用，函数调用须 await；blocking 为真时同步函数的代理阻塞到结果返回
+    - workers > 1 时事件与调用轮流分配到各进程，只适用于无状态的子模块，且不保证事件之间的顺序
+    - 转发的处理器在发送方看来是 fire-and-forget：send_event 不等待工作进程处理完成
+    - start 为真时构造即启动，阻塞到工作进程完成 apply；在事件循环中应以 start=False 构造，再 await astart()，
+      注销同理用 await aclose() 代替 unregister()，等待进程退出在线程池中进行
+    """
+    def __init__(
+        self,
+        ctx: Context,
+        module_name: str,
+        args: tuple = (),
+        kwargs: dict | None = None,
+        workers: int = 1,
+        preload: Iterable[str] = (),
+        start_timeout: float = 30.0,
+        call_timeout: float | None = 30.0,
+        blocking: bool = False,
+        start: bool = True,
+    ):
+        super().__init__(ctx)
+        if workers < 1:
+            raise ValueError("workers 至少为 1。")
+        self.module_name = module_name
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.workers = workers
+        self.preload = tuple(preload)
+        self.start_timeout = start_timeout
+        self.call_timeout = call_timeout
+        self.blocking = blocking
+        self.forwarded = 0
+        self.received = 0
+        self._calls: dict[int, concurrent.futures.Future] = {}
+        self._call_ids = itertools.count()
+        self._incoming: set[int] = set()  # 正在分发的来自工作进程的事件，不再转发回去
+        self._backlog: deque[tuple[Event, ...]] = deque()
+        self._delivering: asyncio.Task | None = None
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._forwarders: list[Callable] = []
+        self._mounted: dict[str, Any] = {}
+        self._workers: list[_Worker] = []
+        self.tree: dict[str, Any] = {}
+        self.event_types: list[type] = []
+        if start:
+            self.start()
+
+    def start(self):
+        "启动工作进程，阻塞到它们完成 apply。"
+        try:
+            self._attach(self._launch())
+        except BaseException:
+            self.unregister()
+            raise
+
+    async def astart(self):
+        "启动工作进程，在线程池中等待它们完成 apply，不阻塞事件循环。"
+        try:
+            self._attach(await self._loop.run_in_executor(None, self._launch))
+        except BaseException:
+            await self.aclose()
+            raise
+
+    def _launch(self) -> list:
+        "启动进程与读写线程并等待注册信息，可在线程池中执行。"
+        mp = multiprocessing.get_context("spawn")
+        for _ in range(self.workers):
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(
+                target=_worker_main, args=(child_conn, self.module_name, self.args, self.kwargs, self.preload), daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            worker = _Worker(process, parent_conn, None)
+            worker.outbox, _ = _start_threads(parent_conn, lambda batch, w=worker: self._on_batch(w, batch))
+            self._workers.append(worker)
+        self._next = itertools.cycle(self._workers).__next__
+        return [w.hello.result(self.start_timeout) for w in self._workers]
+
+    def _attach(self, hellos: list):
+        event_types, self.tree, error = hellos[0]
+        if error is not None:
+            raise error
+        self.event_types = event_types
+        for event_type in event_types:
+            forwarder = self._make_forwarder(event_type)
+            self.ctx.register_event_handler(forwarder, policy="inline")
+            self._forwarders.append(forwarder)
+
+    def _make_forwarder(self, event_type: type):
+        async def forward(event):
+            if id(event) in self._incoming or not self._running:
+                return
+            self.forwarded += 1
+            self._next().outbox.put(("event", (event,)))
+        forward.__annotations__ = {"event": event_type}
+        forward.__qualname__ = f"ProcessShard[{self.module_name}].forward[{event_type.__name__}]"
+        return forward
+
+    def mirror(self) -> dict[str, Any]:
+        "按工作进程的注册信息生成镜像对象。"
+        def build(tree: dict[str, Any], prefix: str) -> dict[str, Any]:
+            result: dict[str, Any] = {}
+            for name, kind in tree.items():
+                path = prefix + name
+                if isinstance(kind, dict):
+                    sub = Context()
+                    for sub_name, value in build(kind, path + ".").items():
+                        sub.register(sub_name, value)
+                    result[name] = sub
+                elif kind == "object":
+                    result[name] = RemoteObject(self, path)
+                else:
+                    result[name] = RemoteCallable(self, path, blocking=self.blocking and kind == "sync")
+            return result
+        return build(self.tree, "")
+
+    def mount(self):
+        "把镜像注册到上下文，注销时一并移除。"
+        for name, value in self.mirror().items():
+            self.ctx.register(name, value)
+            self._mounted[name] = value
+
+    def submit(self, path: str, attr: str | None, args: tuple, kwargs: dict) -> concurrent.futures.Future:
+        return self._submit(path, attr, args, kwargs)[1]
+
+    def _submit(self, path: str, attr: str | None, args: tuple, kwargs: dict) -> tuple[int, concurrent.futures.Future]:
+        if not self._running:
+            raise RuntimeError("工作进程已停止。")
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        call_id = next(self._call_ids)
+        self._calls[call_id] = future
+        worker = self._next()
+        worker.calls.add(call_id)
+        future.add_done_callback(lambda _: worker.calls.discard(call_id))
+        worker.outbox.put(("call", call_id, path, attr, args, kwargs))
+        return call_id, future
+
+    async def _wait(self, call_id: int, future: concurrent.futures.Future) -> Any:
+        "等待调用结果，超过 call_timeout 时抛出 TimeoutError 并丢弃该调用（工作进程卡住但未退出时）。"
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.call_timeout)
+        except asyncio.TimeoutError:
+            self._calls.pop(call_id, None)
+            raise
+
+    def _on_batch(self, worker: _Worker, batch: list | None):
+        "读线程中执行：调用结果直接完成对应的 Future，事件交给事件循环分发。"
+        if batch is None:
+            error = RuntimeError(f"子模块 {self.module_name} 的工作进程已退出。")
+            if not worker.hello.done():
+                worker.hello.set_exception(error)
+            for call_id, future in list(self._calls.items()):
+                if not future.done():
+                    future.set_exception(error)
+            return
+        events = []
+        for message in batch:
+            kind = message[0]
+            if kind == "result":
+                future = self._calls.pop(message[1], None)
+                if future is not None and not future.done():
+                    if message[2]:
+                        future.set_result(message[3])
+                    else:
+                        future.set_exception(message[3])
+            elif kind == "event":
+                events.append(message[1])
+            elif kind == "hello":
+                worker.hello.set_result(message[1:])
+            elif kind == "lost":
+                # 无法确定丢失的是哪些结果，该进程上未完成的调用一律失败，而不是等到超时
+                error = RuntimeError(f"子模块 {self.module_name} 的工作进程消息无法反序列化: {message[1]!r}")
+                if not worker.hello.done():
+                    worker.hello.set_exception(error)
+                for call_id in list(worker.calls):
+                    future = self._calls.pop(call_id, None)
+                    if future is not None and not future.done():
+                        future.set_exception(error)
+        if events and self._running:
+            self._loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, batch: list[tuple[Event, ...]]):
+        "由单个任务按到达顺序逐个分发。"
+        self._backlog.extend(batch)
+        if self._delivering is None or self._delivering.done():
+            self._delivering = self._loop.create_task(self._deliver())
+
+    async def _deliver(self):
+        backlog = self._backlog
+        while backlog and self._running:
+            events = backlog.popleft()
+            ids = [id(e) for e in events]
+            self._incoming.update(ids)
+            try:
+                await self.ctx.send_event(*events)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._incoming.difference_update(ids)
+            self.received += 1
+
+    def unregister(self, timeout: float = 2.0):
+        "停止转发并结束工作进程，阻塞到进程退出（每个最长 timeout 秒）。"
+        self._detach()
+        self._stop_workers(timeout)
+
+    async def aclose(self, timeout: float = 2.0):
+        "同 unregister，但在线程池中等待进程退出；之后再从上下文注销不会重复停止。"
+        self._detach()
+        await self._loop.run_in_executor(None, self._stop_workers, timeout)
+
+    def _detach(self):
+        self._running = False
+        for forwarder in self._forwarders:
+            if self.ctx._has_event_handler(forwarder):
+                self.ctx.unregister_event_handler(forwarder)
+        self._forwarders.clear()
+        for name, value in self._mounted.items():
+            if self.ctx._handler.get(name) is value:
+                self.ctx.unregister(name)
+        self._mounted.clear()
+        for future in self._calls.values():
+            future.cancel()
+        if self._delivering is not None:
+            self._delivering.cancel()
+
+    def _stop_workers(self, timeout: float):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.outbox.put(("stop",))
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.outbox.put(None)
+            worker.conn.close()
+
+def sharded(
+    module: str | types.ModuleType,
+    workers: int = 1,
+    preload: Iterable[str | types.ModuleType] = (),
+    blocking: bool = False,
+) -> types.ModuleType:
+    """
+    把子模块包装为在工作进程中运行的子模块: `ctx.add_sub_module(sharded(pdu, workers=4))`
+    分片需要显式选用，对使用方并不透明：注册的函数（包括同步函数）变为返回可等待对象的代理，
+    使用方应经 Binding.acall 调用，分片与否都适用。
+    preload 为在工作进程中先行加载的子模块（如 logger），目标模块的 inject 须由它们满足。
+    调用超过 30 秒（call_timeout）未返回时抛出 TimeoutError。
+    注意 add_sub_module 与注销都会阻塞事件循环：前者等待工作进程启动并完成 apply（最长 30 秒），
+    后者等待每个工作进程退出（每个最长 2 秒）。事件循环运行期间请改用 start / stop。
+    """
+    name = module if isinstance(module, str) else module.__name__
+    preload_names = tuple(p if isinstance(p, str) else p.__name__ for p in preload)
+    proxy = types.ModuleType(f"{__name__}[{name}]")
+    proxy.__doc__ = f"{name} 的进程分片。"
+
+    def apply(ctx: Context, *args, **kwargs):
+        shard = ProcessShard(ctx, name, args, kwargs, workers, preload_names, blocking=blocking)
+        shard.mount()  # 镜像先于分片注册，整体注销时按注册顺序先移除镜像
+        ctx.register(_shard_name(name), shard)
+
+    proxy.apply = apply  # type: ignore[attr-defined]
+    return proxy
+
+def _shard_name(module_name: str) -> str:
+    return f"shard_{module_name.replace('.', '_')}"
+
+async def start(
+    ctx: Context,
+    module: str | types.ModuleType,
+    args: tuple = (),
+    kwargs: dict | None = None,
+    workers: int = 1,
+    preload: Iterable[str | types.ModuleType] = (),
+    blocking: bool = False,
+) -> ProcessShard:
+    """
+    sharded 的异步版本：`await shard.start(ctx, pdu, workers=4)`，在线程池中等待工作进程启动，不阻塞事件循环。
+    镜像与分片的注册方式同 sharded，但不作为子模块记录（不参与热重载），用 stop 停止。
+    """
+    name = module if isinstance(module, str) else module.__name__
+    preload_names = tuple(p if isinstance(p, str) else p.__name__ for p in preload)
+    shard = ProcessShard(ctx, name, args, kwargs, workers, preload_names, blocking=blocking, start=False)
+    await shard.astart()
+    shard.mount()
+    ctx.register(_shard_name(name), shard)
+    return shard
+
+async def stop(ctx: Context, module: str | types.ModuleType):
+    "停止 start 启动的分片，在线程池中等待工作进程退出。"
+    name = _shard_name(module if isinstance(module, str) else module.__name__)
+    shard = ctx.get(name)
+    await shard.aclose()
+    ctx.unregister(name)
@@ -1,7 +1,12 @@
+import asyncio
+import time
+from collections import OrderedDict
 from noishi import Context as RawContext, Service
-from noishi.event import serial
+from noishi.event import at
 from noishi.event import sms
-from typing import TYPE_CHECKING
+from noishi.exception import AtCommandError
+from noishi.pdu import Pdu
+from typing import TYPE_CHECKING, Iterable
 
 if TYPE_CHECKING:
     from noishi.etype.ctx import ExtendContext_Noishi_Sms as ExtendContext
@@ -9,89 +14,278 @@ if TYPE_CHECKING:
 else:
     Context = RawContext
 
+class _Fragments:
+    __slots__ = ("parts", "received", "updated")
+
+    def __init__(self, total: int):
+        self.parts: list[Pdu | None] = [None] * total
+        self.received = 0
+        self.updated = 0.0
+
+class ConcatReassembler:
+    """
+    长短信重组：按 (发送者, 参考号, 总段数) 收集分段，收齐后合并为一条。
+    未完成的消息按最近更新时间排列，超过 ttl 秒未更新或超出 max_pending 条时淘汰最旧的，
+    每个分段的处理开销为 O(1)。
+    """
+    def __init__(self, max_pending: int = 256, ttl: float = 24 * 3600):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.evicted = 0
+        self._pending: OrderedDict[tuple[str, int, int], _Fragments] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, pdu: Pdu) -> Pdu | None:
+        "加入一条 PDU，返回完整消息；分段未收齐时返回 None。"
+        concat = pdu.concat
+        if concat is None or concat.total < 2 or not 1 <= concat.sequence <= concat.total:
+            return pdu
+
+        now = time.monotonic()
+        pending = self._pending
+        while pending:
+            oldest = next(iter(pending.values()))
+            if now - oldest.updated <= self.ttl:
+                break
+            pending.popitem(last=False)
+            self.evicted += 1
+
+        key = (pdu.sender, concat.reference, concat.total)
+        fragments = pending.get(key)
+        if fragments is None:
+            if len(pending) >= self.max_pending:
+                pending.popitem(last=False)
+                self.evicted += 1
+            fragments = pending[key] = _Fragments(concat.total)
+        else:
+            pending.move_to_end(key)
+        fragments.updated = now
+        parts = fragments.parts
+        if parts[concat.sequence - 1] is None:
+            fragments.received += 1
+        parts[concat.sequence - 1] = pdu  # 重复的分段覆盖旧的，不重复计数
+
+        if fragments.received < concat.total:
+            return None
+        del pending[key]
+        return Pdu(parts[0].sca_number, pdu.sender, "".join(p.text for p in parts), parts[0].text_type)
+
 class AtSmsService(Service[Context]):
-    def __init__(self, ctx: Context):
+    """
+    单个端口的短信收发服务，URC 由 AtSmsPool 按端口分发。
+    - drain 模式（默认）: +CMTI 与启动时用一条 +CMGL 列出全部短信，解码后按 +CMGD=,1 批量删除已读短信
+    - 否则每条 +CMTI 各执行一次 +CMGR 与 +CMGD
+    """
+    def __init__(self, ctx: Context, port: str | None = None, drain: bool = True, drain_timeout: float = 60.0):
         super().__init__(ctx)
-        self.buffer = ""
+        self.port = port or ctx.serial.port
+        self.drain_mode = drain
+        self.drain_timeout = drain_timeout
+        self.reassembler = ConcatReassembler()
         self.logger = ctx.logger("sms")
+        self.at_send = ctx.bind("at.send")
+        self.at_build = ctx.bind("at.command.build")
+        self.at_export = ctx.bind("at.command.export")
+        self.parse_pdu = ctx.bind("pdu.parse")
+        self.decode_many = ctx.bind("pdu.decode_many")
+        self.encode_pdu = ctx.bind("pdu.encode")
+        self._pdu_mode = False
         self._running = True
-        
-        self.pending_lines: list[str] = []
-        self.pending_command = False
-        self.last_delete_index = None
-        
-        ctx.register_event_handler(self.handle_serial_rx)
-    
-    async def handle_serial_rx(self, event: serial.SerialDataReceived):
+        self._drain_tasks: dict[str, asyncio.Task] = {}
+        self._drain_again: set[str] = set()
+
+        if drain:
+            self._startup = asyncio.create_task(self.startup())
+
+    async def startup(self, attempts: int = 3, interval: float = 2.0):
+        "切换到 PDU 模式并清空启动前积压的短信；串口可能尚未就绪，失败时重试。"
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.at_send(self.at_build("+CMGF", 0), port=self.port)
+                self._pdu_mode = True
+                break
+            except (AtCommandError, asyncio.TimeoutError) as e:
+                await self.logger.warning(f"设置 PDU 模式失败 ({attempt}/{attempts}): {e}")
+                if attempt == attempts:
+                    return
+                await asyncio.sleep(interval)
+        self.request_drain(self.port)
+
+    async def handle_urc(self, event: at.AtUrcReceived):
         if not self._running:
             return
+        await self.logger.debug("URC: %s", event.line)
 
-        data_str = event.data.decode()
-        self.buffer += data_str
+        if event.line.startswith('+CMTI:'):
+            cmti_data = self.at_export(event.line, "+CMTI: ")
+            if cmti_data:
+                parts = cmti_data[0].split(',')
+                if len(parts) == 2:
+                    index = parts[1].strip()
+                    await self.logger.debug("检测到新短信索引: %s", index)
+                    if self.drain_mode:
+                        self.request_drain(event.port)
+                    else:
+                        await self.read_message(event.port, index)
+        elif event.line.startswith('+CMT:') and event.payload:
+            await self.handle_pdu(event.payload)
 
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            line = line.strip()
-            if not line:
-                continue
+    async def read_message(self, port: str, index: str):
+        "读取并删除存储中的一条短信。"
+        try:
+            lines = await self.at_send(self.at_build("+CMGR", index), port=port)
+            for i, line in enumerate(lines):
+                if line.startswith("+CMGR:") and i + 1 < len(lines):
+                    await self.handle_pdu(lines[i + 1])
+                    break
+            await self.at_send(self.at_build("+CMGD", index, 0), port=port)
+            await self.logger.debug("已删除短信索引: %s", index)
+        except (AtCommandError, asyncio.TimeoutError) as e:
+            await self.logger.error(f"读取短信索引 {index} 失败: {e}")
 
-            await self.logger.debug(f"串口输入: {line}")
-
-            if line.startswith('+CMTI:'):
-                cmti_data = self.ctx.at.command.export(line, "+CMTI: ")
-                if cmti_data:
-                    parts = cmti_data[0].split(',')
-                    if len(parts) == 2:
-                        index = parts[1].strip()
-                        self.last_delete_index = index
-                        await self.logger.debug(f"检测到新短信索引: {index}")
-                        await self.ctx.send_event(
-                            serial.SerialWriteRequest(event.port, self.ctx.at.command.build("+CMGR", index).encode())
-                        )
-                        self.pending_command = True
-                        self.pending_lines.clear()
-                continue
+    def request_drain(self, port: str):
+        "请求清空端口的短信存储，执行中的清空结束后会再执行一次，连续的通知合并处理。"
+        if not self._running:
+            return
+        task = self._drain_tasks.get(port)
+        if task is not None and not task.done():
+            self._drain_again.add(port)
+            return
+        self._drain_tasks[port] = asyncio.create_task(self._drain_loop(port))
 
-            if line.startswith('+CMT:'):
-                pdu_line, self.buffer = self.buffer.split('\n', 1)
-                pdu_line = pdu_line.strip()
-                if pdu_line:
-                    sca_number, sender, text, text_type = self.ctx.pdu.decode(pdu_line)
-                    await self.ctx.send_event(sms.SmsReceived(sca_number, sender, text, text_type))
-                continue
+    async def _drain_loop(self, port: str):
+        while True:
+            self._drain_again.discard(port)
+            try:
+                await self.drain(port)
+            except (AtCommandError, asyncio.TimeoutError) as e:
+                await self.logger.error(f"清空短信存储失败: {e}")
+            if port not in self._drain_again or not self._running:
+                return
 
-            if self.pending_command:
-                self.pending_lines.append(line)
-
-                if line in ("OK", "ERROR"):
-                    result_text = "\n".join(self.pending_lines)
-                    await self.logger.debug(f"AT命令完整响应:\n{result_text}")
-                    self.pending_command = False
-                    lines = result_text.splitlines()
-                    for i, line in enumerate(lines):
-                        if line.startswith("+CMGR:"):
-                            if i + 1 < len(lines):
-                                pdu_line = lines[i + 1].strip()
-                                if pdu_line:
-                                    sca_number, sender, text, text_type = self.ctx.pdu.decode(pdu_line)
-                                    await self.ctx.send_event(sms.SmsReceived(sca_number, sender, text, text_type))
-                                    if self.last_delete_index is not None:
-                                        await self.ctx.send_event(
-                                            serial.SerialWriteRequest(
-                                                event.port, self.ctx.at.command.build("+CMGD", self.last_delete_index, 0).encode()
-                                            )
-                                        )
-                                        await self.logger.debug(f"已删除短信索引: {self.last_delete_index}")
-                                        self.last_delete_index = None
-                                    break
-                    self.pending_lines.clear()
+    async def drain(self, port: str) -> int:
+        "列出并处理存储中的全部已接收短信，返回处理条数。"
+        lines = await self.at_send(self.at_build("+CMGL", 4), port=port, timeout=self.drain_timeout)
+        entries: list[tuple[str, str]] = []
+        malformed: list[str] = []
+        for i, line in enumerate(lines):
+            if line.startswith("+CMGL:") and i + 1 < len(lines):
+                fields = line[6:].split(",")
+                if len(fields) < 2:
+                    malformed.append(line)
+                    continue
+                index, stat = fields[0].strip(), fields[1].strip()
+                if stat in ("0", "1"):  # 只处理已接收的短信，忽略存储的待发/已发短信
+                    entries.append((index, lines[i + 1]))
+        for line in malformed:
+            # 无法得知索引，不能整体删除，这条短信保留在存储中
+            await self.logger.error(f"无法解析的 +CMGL 行，已跳过: {line!r}")
+        if not entries:
+            return 0
+
+        done: list[str] = []
+        failed: list[str] = []
+        results = await self.decode_many.acall([pdu for _, pdu in entries])
+        for (index, _), result in zip(entries, results):
+            if result.error is not None:
+                failed.append(index)
+                await self.logger.error(f"短信索引 {index} 解码失败，保留在存储中: {result.error!r}")
                 continue
-    
+            done.append(index)
+            await self.handle_parsed(result.value)
+
+        if not failed and not malformed:
+            await self.at_send(self.at_build("+CMGD", 1, 1), port=port)
+        else:
+            await asyncio.gather(*(self.at_send(self.at_build("+CMGD", index, 0), port=port) for index in done))
+        await self.logger.debug("已清空短信存储: 处理 %d 条，失败 %d 条", len(done), len(failed))
+        return len(done)
+
+    async def send(self, number: str, text: str, timeout: float = 60.0) -> list[int]:
+        """
+        发送短信，超长时自动分段，返回各段的消息参考号。
+        所有分段一次性进入 AT 命令队列，上一段返回 OK 后立即发送下一段，不做固定等待。
+        """
+        if not self._pdu_mode:
+            await self.at_send(self.at_build("+CMGF", 0), port=self.port)
+            self._pdu_mode = True
+        segments = await self.encode_pdu.acall(number, text)
+        results = await asyncio.gather(*(
+            # 只以 \r 结束，避免换行符落入 PDU 输入
+            self.at_send(self.at_build("+CMGS", segment.tpdu_length, terminator="\r"), port=self.port, timeout=timeout, data=segment.pdu)
+            for segment in segments
+        ))
+        references = []
+        for lines in results:
+            reference = next((line[6:].split(",")[0].strip() for line in lines if line.startswith("+CMGS:")), None)
+            references.append(int(reference) if reference is not None and reference.isdigit() else -1)
+        await self.logger.debug("已发送短信到 %s: %d 段", number, len(segments))
+        return references
+
+    async def handle_pdu(self, pdu_line: str):
+        "解码 PDU，经长短信重组后发送 SmsReceived。"
+        await self.handle_parsed(await self.parse_pdu.acall(pdu_line))
+
+    async def handle_parsed(self, pdu: Pdu):
+        message = self.reassembler.add(pdu)
+        if message is None:
+            await self.logger.debug("收到长短信分段，等待其余分段（未完成 %d 条）", len(self.reassembler))
+            return
+        await self.ctx.send_event(sms.SmsReceived(message.sca_number, message.sender, message.text, message.text_type))
+
     def unregister(self):
         self._running = False
-        self.ctx.unregister_event_handler(self.handle_serial_rx)
-        
-def apply(ctx: Context):
-    ctx.register("sms", AtSmsService(ctx))
+        for task in self._drain_tasks.values():
+            task.cancel()
+        if self.drain_mode:
+            self._startup.cancel()
+
+class AtSmsPool(Service[Context]):
+    """
+    每个端口一个 AtSmsService，注册为 "sms"。
+    只注册一个 URC 处理器，按端口查表分发；send 按 AT 命令队列深度选出最空闲的端口发送。
+    """
+    def __init__(self, ctx: Context, ports: Iterable[str], drain: bool = True, drain_timeout: float = 60.0):
+        super().__init__(ctx)
+        self.services = {port: AtSmsService(ctx, port, drain, drain_timeout) for port in ports}
+        if not self.services:
+            raise ValueError("至少需要一个端口。")
+        self._pick_port = ctx.bind("at.pick_port")
+        # 处理 URC 时要等待 AT 响应，而响应由同一条串口接收链送达，因此不能在分发中同步等待
+        ctx.register_event_handler(self.handle_urc, policy="fire-and-forget")
+
+    @property
+    def ports(self) -> list[str]:
+        return list(self.services)
+
+    def __getitem__(self, port: str) -> AtSmsService:
+        return self.services[port]
+
+    def pick_port(self) -> str:
+        return self._pick_port(self.services)
+
+    async def send(self, number: str, text: str, port: str | None = None, timeout: float = 60.0) -> list[int]:
+        "发送短信，未指定端口时选择 AT 命令队列最短的端口，同一条短信的分段经同一端口发出。"
+        return await self.services[port or self.pick_port()].send(number, text, timeout)
+
+    async def handle_urc(self, event: at.AtUrcReceived):
+        service = self.services.get(event.port)
+        if service is not None:
+            await service.handle_urc(event)
+
+    def unregister(self):
+        self.ctx.unregister_event_handler(self.handle_urc)
+        for service in self.services.values():
+            service.unregister()
+
+def apply(ctx: Context, port: str | Iterable[str] | None = None, drain: bool = True):
+    "port 默认为串口池中的全部端口。"
+    if port is None:
+        ports = ctx.serial.ports
+    else:
+        ports = [port] if isinstance(port, str) else list(port)
+    ctx.register("sms", AtSmsPool(ctx, ports, drain))
 
 inject = ["logger", "pdu", "at", "serial"]
\ No newline at end of file
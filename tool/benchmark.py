@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+from noishi import Context, Event, eventclass
+from noishi import at, pdu, replay, shard, sms
+from noishi import logger as Logger
+from noishi.event.serial import SerialDataReceived
+from noishi.logger import LogEvent, LogLevel
+from noishi.event.sms import SmsReceived
+from noishi.filelog import FileLogService
+
+@eventclass
+class BenchEvent(Event):
+    seq: int
+
+def _report(name: str, count: int, elapsed: float):
+    print(f"{name:<24} {count:>9} 次  {elapsed * 1e9 / count:>10.1f} ns/次  {count / elapsed:>12.0f} 次/秒")
+
+# ---------------------- dispatch ----------------------
+async def _bench_dispatch_policy(policy: str, count: int, metrics: bool = False) -> float:
+    ctx = Context()
+    if metrics:
+        ctx.enable_metrics()
+    received = 0
+
+    @ctx.register_event_handler(policy=policy)
+    async def handler(event: BenchEvent):
+        nonlocal received
+        received += 1
+
+    start = time.perf_counter()
+    for i in range(count):
+        await ctx.send_event(BenchEvent(i))
+    while received < count:
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+def bench_dispatch(count: int):
+    "单处理器事件在各执行策略下的每事件开销，以及启用统计后的开销。"
+    for policy in ("inline", "concurrent", "fire-and-forget"):
+        _report(f"dispatch[{policy}]", count, asyncio.run(_bench_dispatch_policy(policy, count)))
+    _report("dispatch[inline+metrics]", count, asyncio.run(_bench_dispatch_policy("inline", count, metrics=True)))
+
+# ---------------------- gsm 7-bit ----------------------
+def _legacy_unpack_7bit(data: bytes, length: int) -> bytes:
+    "逐字节实现（优化前），作为对照。"
+    septets = []
+    carry = 0
+    carry_bits = 0
+    for b in data:
+        current = ((b << carry_bits) & 0x7F) | carry
+        septets.append(current)
+        carry = b >> (7 - carry_bits)
+        carry_bits += 1
+        if carry_bits == 7:
+            septets.append(carry)
+            carry_bits = 0
+            carry = 0
+    return bytes(septets[:length])
+
+def _legacy_decode_7bit(data: bytes, length: int) -> str:
+    return _legacy_unpack_7bit(data, length).decode("gsm03.38")
+
+def bench_7bit(count: int):
+    "160 字符短信 (140 字节) 的 7-bit 解包与解码。"
+    septets = pdu.unpack_7bit(os.urandom(140), 160).replace(b"\x1b", b"\x00")
+    data = sum(s << (7 * i) for i, s in enumerate(septets)).to_bytes(140, "little")
+    assert pdu.unpack_7bit(data, 160) == _legacy_unpack_7bit(data, 160)
+    assert pdu.decode_7bit(data, 160) == _legacy_decode_7bit(data, 160)
+    for name, func in (
+        ("unpack_7bit[legacy]", _legacy_unpack_7bit),
+        ("unpack_7bit", pdu.unpack_7bit),
+        ("decode_7bit[legacy]", _legacy_decode_7bit),
+        ("decode_7bit", pdu.decode_7bit),
+    ):
+        start = time.perf_counter()
+        for _ in range(count):
+            func(data, 160)
+        _report(name, count, time.perf_counter() - start)
+
+# ---------------------- pdu ----------------------
+PDU_FIXTURES = Path(__file__).with_name("pdu_fixtures.txt")
+
+def load_pdu_fixtures() -> list[str]:
+    lines = PDU_FIXTURES.read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+def bench_pdu(count: int):
+    "解析器对照：先校验夹具结果一致，再循环解码 count 条。"
+    fixtures = load_pdu_fixtures()
+    for item in fixtures:
+        assert pdu.parse_pdu_fast(item) == pdu.parse_pdu(item), item
+    corpus = list(itertools.islice(itertools.cycle(fixtures), count))
+    for name, func in pdu.PDU_PARSERS.items():
+        start = time.perf_counter()
+        for item in corpus:
+            func(item)
+        _report(f"parse_pdu[{name}]", count, time.perf_counter() - start)
+
+# ---------------------- filelog ----------------------
+async def _bench_filelog_format(directory: str, format: str, count: int) -> tuple[float, int, int]:
+    ctx = Context()
+    suffix = ".ndjson" if format == "ndjson" else ".bin"
+    # 每 16 MiB 切换一次文件段，使轮转开销计入结果
+    sink = FileLogService(ctx, Path(directory, format + suffix), format=format, max_bytes=16 * 1024 * 1024)
+    # 典型的 +CMT URC 数据块
+    event = SerialDataReceived("COM6", b'+CMT: ,30\r\n0891683108200805F0040D91683167401520F00008' + b"0" * 60 + b"\r\n")
+    start = time.perf_counter()
+    for _ in range(count):
+        await ctx.send_event(event)
+    sink.flush()
+    elapsed = time.perf_counter() - start
+    sink.unregister()
+    return elapsed, sink.bytes_written, sink.rotations
+
+def bench_filelog(count: int):
+    "持续写入串口接收事件（含事件分发），输出每条开销与写入带宽。"
+    with tempfile.TemporaryDirectory() as directory:
+        for format in ("ndjson", "binary"):
+            elapsed, written, rotations = asyncio.run(_bench_filelog_format(directory, format, count))
+            _report(f"filelog[{format}]", count, elapsed)
+            print(f"{'':<24} {written / elapsed / 1024 / 1024:>9.1f} MiB/s  轮转 {rotations} 次")
+
+# ---------------------- e2e ----------------------
+def build_cmt_capture(count: int, interval: float = 0.0, port: str = "COM6") -> list[replay.CaptureChunk]:
+    "用单段短信夹具生成 +CMT URC 采集，每块一条短信。"
+    fixtures = [item for item in load_pdu_fixtures() if pdu.parse_pdu_fast(item).concat is None]
+    chunks = []
+    for i, item in enumerate(itertools.islice(itertools.cycle(fixtures), count)):
+        tpdu_len = len(item) // 2 - 1 - int(item[:2], 16)
+        chunks.append(replay.CaptureChunk(i * interval, port, f"\r\n+CMT: ,{tpdu_len}\r\n{item}\r\n".encode()))
+    return chunks
+
+async def _bench_e2e(chunks: list[replay.CaptureChunk], speed: float | None) -> tuple[float, list[float]]:
+    ctx = Context()
+    ctx.add_sub_module(Logger, level=Logger.LogLevel.ERROR)
+    ctx.add_sub_module(pdu)
+    ctx.add_sub_module(at)
+    fed: deque[float] = deque()
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    @ctx.register_event_handler(policy="inline")
+    async def mark(event: SerialDataReceived):
+        fed.append(time.perf_counter())
+
+    @ctx.register_event_handler
+    async def received(event: SmsReceived):
+        latencies.append(time.perf_counter() - fed.popleft())
+        if len(latencies) == len(chunks):
+            done.set()
+
+    start = time.perf_counter()
+    ctx.add_sub_module(replay, chunks, speed=speed)
+    ctx.add_sub_module(sms, drain=False)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    ctx.log_sink.unregister()
+    return elapsed, latencies
+
+def bench_e2e(count: int):
+    "回放 +CMT 采集经 serial → at → sms → pdu 得到 SmsReceived: 尽快回放的吞吐，以及满载与 1ms 间隔下 URC 到 SmsReceived 的延迟。"
+    for name, chunks, speed in (
+        ("e2e[max]", build_cmt_capture(count), None),
+        ("e2e[1ms]", build_cmt_capture(min(count, 2000), 0.001), 1.0),
+    ):
+        elapsed, latencies = asyncio.run(_bench_e2e(chunks, speed))
+        _report(name, len(chunks), elapsed)
+        q = statistics.quantiles(latencies, n=100)
+        print(f"{'':<24} 延迟 p50 {q[49] * 1e6:.0f} µs  p99 {q[98] * 1e6:.0f} µs  max {max(latencies) * 1e6:.0f} µs")
+
+# ---------------------- sms send ----------------------
+def _modem_responder(data: bytes) -> bytes:
+    "模拟调制解调器：回显命令，AT+CMGS 给出提示符，PDU 以 Ctrl-Z 结束后返回参考号。"
+    if data.startswith(b"AT+CMGS="):
+        return data + b"\r\n> "
+    if data.endswith(b"\x1a"):
+        return data + b"\r\n+CMGS: 1\r\n\r\nOK\r\n"
+    return data + b"\r\nOK\r\n"
+
+async def _bench_sms_send(text: str, count: int) -> tuple[float, int]:
+    ctx = Context()
+    ctx.add_sub_module(Logger, level=Logger.LogLevel.ERROR)
+    ctx.add_sub_module(pdu)
+    ctx.add_sub_module(at)
+    ctx.add_sub_module(replay, [], port="SIM0", speed=None, respond=_modem_responder)
+    ctx.add_sub_module(sms, drain=False)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(ctx.sms.send("+8613800138000", text) for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    ctx.log_sink.unregister()
+    return elapsed, sum(map(len, results))
+
+def bench_sms_send(count: int):
+    "经 AT+CMGS 发送短信（模拟调制解调器即时应答），输出软件流水线每个端口的条/分钟上限。"
+    for name, text in (
+        ("sms_send[gsm7]", "Your verification code is 123456."),
+        ("sms_send[ucs2x3]", "验证码" * 60),
+    ):
+        elapsed, segments = asyncio.run(_bench_sms_send(text, count))
+        _report(name, count, elapsed)
+        print(f"{'':<24} {count / elapsed * 60:>12.0f} 条/分钟  {segments / elapsed * 60:>12.0f} 段/分钟")
+
+# ---------------------- shard ----------------------
+async def _bench_shard(corpus: list[str], batch: int, workers: int | None) -> float:
+    "批量解码 corpus；workers 为 None 时在本进程中解码，否则经分片的 pdu 子模块并发解码。"
+    ctx = Context()
+    ctx.add_sub_module(pdu if workers is None else shard.sharded(pdu, workers=workers))
+    batches = [corpus[i:i + batch] for i in range(0, len(corpus), batch)]
+    decode_many = ctx.pdu.decode_many
+    start = time.perf_counter()
+    if workers is None:
+        for items in batches:
+            list(decode_many(items))
+    else:
+        await asyncio.gather(*(decode_many.acall(items) for items in batches))
+    elapsed = time.perf_counter() - start
+    ctx.unregister()
+    return elapsed
+
+def bench_shard(count: int):
+    "pdu 子模块在工作进程中运行时的批量解码吞吐（含序列化与管道开销），对照本进程解码。"
+    corpus = list(itertools.islice(itertools.cycle(load_pdu_fixtures()), count))
+    _report("shard[in-process]", count, asyncio.run(_bench_shard(corpus, 256, None)))
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        _report(f"shard[workers={workers}]", count, asyncio.run(_bench_shard(corpus, 256, workers)))
+
+# ---------------------- events ----------------------
+class _LegacySerialDataReceived(Event):
+    "带 __dict__ 的普通事件类（转换为 @eventclass 之前的定义），作为对照。"
+    def __init__(self, port: str, data: bytes):
+        self.port = port
+        self.data = data
+
+def _measure_events(factory: Callable[[int], Event], count: int) -> tuple[float, float]:
+    "创建 count 个事件并全部保留，返回每个事件的创建耗时与内存占用（字节）。"
+    start = time.perf_counter()
+    events = [factory(i) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    del events
+    tracemalloc.start()
+    events = [factory(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+    return elapsed, size / count
+
+def bench_events(count: int):
+    "事件对象的创建开销与内存占用（含列表中的 8 字节指针，字段值共享；LogEvent 另含时间戳对象）。"
+    data = b"\r\n+CMTI: \"SM\",1\r\n"
+    for name, factory in (
+        ("events[dict]", lambda i: _LegacySerialDataReceived("COM6", data)),
+        ("events[slots]", lambda i: SerialDataReceived("COM6", data)),
+        ("events[LogEvent]", lambda i: LogEvent(LogLevel.INFO, "message")),
+    ):
+        elapsed, size = _measure_events(factory, count)
+        _report(name, count, elapsed)
+        print(f"{'':<24} {size:>9.1f} 字节/个  {size * count / 2**20:>10.1f} MiB")
+
+BENCHMARKS: dict[str, tuple[Callable[[int], None], int]] = {
+    "dispatch": (bench_dispatch, 200_000),
+    "7bit": (bench_7bit, 100_000),
+    "pdu": (bench_pdu, 100_000),
+    "filelog": (bench_filelog, 200_000),
+    "e2e": (bench_e2e, 20_000),
+    "sms_send": (bench_sms_send, 5_000),
+    "shard": (bench_shard, 200_000),
+    "events": (bench_events, 1_000_000),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="noishi 性能基准")
+    parser.add_argument("names", nargs="*", help=f"要运行的基准（{', '.join(BENCHMARKS)}），默认全部")
+    parser.add_argument("-n", "--count", type=int, default=None, help="迭代次数")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"未知基准 '{name}'")
+
+    for name in args.names or BENCHMARKS:
+        func, default_count = BENCHMARKS[name]
+        print(f"== {name}")
+        func(args.count or default_count)
+
+if __name__ == "__main__":
+    main()
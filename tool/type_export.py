@@ -4,6 +4,9 @@ import os
 from typing import Optional, Union
 from collections import defaultdict
 
+# 只用于测试与基准的替身模块，它们的注册（如 replay 注册的 "serial"）会覆盖正式模块的类型
+EXCLUDED_MODULES = {"noishi.replay", "tool.benchmark"}
+
 class RegisterVisitor(ast.NodeVisitor):
     
     def __init__(self, module_prefix: str):
@@ -618,7 +621,7 @@ def _get_module_prefix(file_path: str) -> str:
     parts = [p for p in rel_no_ext.split(os.sep) if p]
     return '.'.join(parts)
 
-def scan_directory(src_dir: str) -> tuple[dict, dict, dict, set, dict, dict]:
+def scan_directory(src_dir: str, exclude: set[str] = EXCLUDED_MODULES) -> tuple[dict, dict, dict, set, dict, dict]:
     all_funcs = {}
     all_classes = {}
     all_local_contexts = set()
@@ -630,6 +633,8 @@ def scan_directory(src_dir: str) -> tuple[dict, dict, dict, set, dict, dict]:
             if filename.endswith('.py'):
                 file_path = os.path.join(root, filename)
                 mod_name = _get_module_prefix(file_path)
+                if mod_name in exclude:
+                    continue
                 
                 try:
                     with open(file_path, 'r', encoding='utf-8') as f: